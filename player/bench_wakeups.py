@@ -0,0 +1,86 @@
+"""
+bench_wakeups.py
+Compares UI wakeups of the event-driven player with the old 100 ms polling timer.
+
+Plays a video for a few seconds, then pauses it for the same time, and counts for each phase:
+ - UI refreshes (calls to update_slider)
+ - polls of a 100 ms timer making the same VLC calls the player used to make (only with --poll)
+ - voluntary context switches of the whole process (Linux/macOS), a rough measure of CPU wakeups
+
+Run it twice and compare the paused rows:
+    python player/bench_wakeups.py path/to/video.mp4 5
+    python player/bench_wakeups.py path/to/video.mp4 5 --poll
+"""
+import resource
+import sys
+
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication
+
+from player_qt6 import VideoPlayer
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != "--poll"]
+    poll = "--poll" in sys.argv
+    video = args[0]
+    phase_ms = int(float(args[1]) * 1000) if len(args) > 1 else 5000
+
+    app = QApplication(sys.argv[:1])
+    player = VideoPlayer()
+    player.show()
+    player.finish_startup()
+
+    counts = {"refreshes": 0, "polls": 0}
+    update_slider = player.update_slider
+
+    def counting_update():
+        counts["refreshes"] += 1
+        update_slider()
+    player.timer.timeout.disconnect()
+    player.timer.timeout.connect(counting_update)
+
+    def old_poll():
+        """What the player's 100 ms timer used to do on every tick"""
+        counts["polls"] += 1
+        if player.player.is_playing() and player.player.get_media():
+            player.player.get_length()
+            player.player.get_time()
+
+    poll_timer = QTimer()
+    poll_timer.setInterval(100)
+    poll_timer.timeout.connect(old_poll)
+
+    results = []
+
+    def snapshot(phase):
+        results.append((phase, dict(counts), resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw))
+        counts.update(refreshes=0, polls=0)
+
+    def start():
+        player.load_media(video)
+        if poll:
+            poll_timer.start()
+        snapshot("start")
+        QTimer.singleShot(phase_ms, pause)
+
+    def pause():
+        snapshot("playing")
+        player.pause()
+        QTimer.singleShot(phase_ms, finish)
+
+    def finish():
+        snapshot("paused")
+        player.stop()
+        app.quit()
+
+    QTimer.singleShot(500, start)
+    app.exec()
+
+    print(f"{'phase':<10}{'refreshes':>12}{'100ms polls':>14}{'ctx switches':>14}")
+    for (_, _, before), (phase, phase_counts, after) in zip(results, results[1:]):
+        print(f"{phase:<10}{phase_counts['refreshes']:>12}{phase_counts['polls']:>14}{after - before:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,20 +9,57 @@ The player can grab a single frame from a paused video, and send it to a server
 
 TODO: add support for youtube.
 
+Start up: the window is painted first, then libvlc is loaded and VLC and the HTTP client are initialised.
+Run with --startup-timing (or CYCLOPS_STARTUP_TIMING=1) to print import and init timings.
 """
+import time
+_started = time.perf_counter()
 
 import sys
+import os
 import json
 import platform
+import tempfile
 from pathlib import Path
 
 from PyQt6.QtGui import QShortcut, QKeySequence
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QLabel,QFileDialog, QMessageBox, QFrame, QComboBox, QSlider, QTextEdit, QSpinBox, QDialog, QDialogButtonBox)
-from PyQt6.QtCore import Qt, QTimer
-import vlc
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
 
 # Constants
+UI_UPDATE_MS = 100      # at most one slider/time label refresh per this many ms
 DEFAULT_API_URL = 'http://localhost:8000/frame/ocr'
+STARTUP_TIMING = "--startup-timing" in sys.argv or os.environ.get("CYCLOPS_STARTUP_TIMING") == "1"
+
+_requests = None
+vlc = None      # the python-vlc module, imported by get_vlc()
+
+
+def log_timing(what):
+    """Print time since the process started, in startup timing mode"""
+    if STARTUP_TIMING:
+        print(f"[startup] {what}: {(time.perf_counter() - _started) * 1000:.0f} ms", file=sys.stderr)
+
+
+def get_vlc():
+    """Import python-vlc on first use (importing it loads libvlc through ctypes)"""
+    global vlc
+    if vlc is None:
+        import vlc as vlc_module
+        vlc = vlc_module
+    return vlc
+
+
+def get_requests():
+    """Import requests on first use (it's slow to import, and only needed for OCR)"""
+    global _requests
+    if _requests is None:
+        import requests
+        _requests = requests
+    return _requests
+
+
+log_timing("imports")
 
 class SettingsDialog(QDialog):
     """
@@ -101,15 +138,23 @@ class VideoPlayer(QMainWindow):
     """
     Main window for video player app, using Qt6.
 
+    Playback position comes from libvlc events rather than polling, so nothing runs while paused.
     """
+    # libvlc calls event handlers on its own thread, these signals hand them over to the Qt thread
+    vlc_time_changed = pyqtSignal(int)
+    vlc_length_changed = pyqtSignal(int)
+    vlc_stopped = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Cyclops Video Player")
         self.setGeometry(100, 100, 900, 700)
 
-        # VLC instance and player
-        self.instance = vlc.Instance()
-        self.player = self.instance.media_player_new()
+        # VLC instance and player are created after first paint, see finish_startup()
+        self._painted = False
+        self.instance = None
+        self.player = None
+        self.vlc_events = None
 
         # Load config
         self.config_path = self.get_config_path()
@@ -119,11 +164,18 @@ class VideoPlayer(QMainWindow):
         self.skip_long = self.config.get('skip_long', 30)
         self.api_url = self.config.get('api_url', DEFAULT_API_URL)
 
-        # Timer for updating slider
+        # Playback position, as last reported by VLC events
+        self.position_ms = 0
+        self.length_ms = 0
+        self.vlc_time_changed.connect(self.on_time_changed)
+        self.vlc_length_changed.connect(self.on_length_changed)
+        self.vlc_stopped.connect(lambda: self.on_time_changed(0))
+
+        # Single-shot timer to coalesce bursts of events into one UI refresh. Only runs after an event.
         self.timer = QTimer(self)
-        self.timer.setInterval(100)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(UI_UPDATE_MS)
         self.timer.timeout.connect(self.update_slider)
-        self.timer.start()
 
         # Flag to prevent slider update during user drag
         self.slider_pressed = False
@@ -268,7 +320,7 @@ class VideoPlayer(QMainWindow):
         playback_layout.addWidget(QLabel("Volume:"))
         self.volume_slider = QSlider(Qt.Orientation.Horizontal)
         self.volume_slider.setRange(0, 100)  # VLC volume range = 0–100
-        self.volume_slider.setValue(self.player.audio_get_volume())
+        self.volume_slider.setValue(100)    # updated from VLC in finish_startup()
         self.volume_slider.valueChanged.connect(self.change_volume)
         playback_layout.addWidget(self.volume_slider)
 
@@ -321,6 +373,27 @@ class VideoPlayer(QMainWindow):
         self.setTabOrder(stop_btn, self.speed_combo)
         self.setTabOrder(self.speed_combo, capture_btn)
 
+        log_timing("window built")
+
+    def finish_startup(self):
+        """Load libvlc, create the VLC instance, embed it, and preload requests.
+        Called once the window has been painted, so the user sees a window straight away.
+        Safe to call more than once.
+        """
+        if self.player is not None:
+            return
+        get_vlc()
+        log_timing("libvlc loaded")
+        self.instance = vlc.Instance()
+        self.player = self.instance.media_player_new()
+        self.volume_slider.setValue(self.player.audio_get_volume())
+        self.attach_vlc_events()
+        if hasattr(self, '_embedded'):
+            self.embed_video()
+        log_timing("VLC ready")
+        get_requests()
+        log_timing("requests imported")
+
 #####  SHORTCUTS ######
 
     def setup_shortcuts(self):
@@ -379,6 +452,8 @@ class VideoPlayer(QMainWindow):
             
     def change_volume(self, value):
         """Change VLC player volume. """
+        if self.player is None:
+            return
         try:
             self.player.audio_set_volume(int(value))
         except Exception as e:
@@ -389,7 +464,6 @@ class VideoPlayer(QMainWindow):
         if platform.system() == "Darwin":  # macOS
             config_dir = Path.home() / "Library" / "Application Support" / "Cyclops"
         elif platform.system() == "Windows":
-            import os
             config_dir = Path(os.environ.get('APPDATA', Path.home())) / "Cyclops"
         else:  # Linux
             config_dir = Path.home() / ".config" / "cyclops"
@@ -464,22 +538,39 @@ class VideoPlayer(QMainWindow):
             # Save config
             self.save_config()
 
+    def attach_vlc_events(self):
+        """Subscribe to libvlc time, length and state events.
+        Reference: https://www.olivieraubert.net/vlc/python-ctypes/doc/vlc.EventManager-class.html
+        """
+        # kept on the window: if the event manager is garbage collected, libvlc stops calling our callbacks
+        self.vlc_events = self.player.event_manager()
+        self.vlc_events.event_attach(vlc.EventType.MediaPlayerTimeChanged,
+                                     lambda event: self.vlc_time_changed.emit(event.u.new_time))
+        self.vlc_events.event_attach(vlc.EventType.MediaPlayerLengthChanged,
+                                     lambda event: self.vlc_length_changed.emit(event.u.new_length))
+        self.vlc_events.event_attach(vlc.EventType.MediaPlayerStopped, lambda event: self.vlc_stopped.emit())
+
+    def on_time_changed(self, ms):
+        """Record the new position, and schedule a UI refresh unless one is already pending"""
+        self.position_ms = ms
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def on_length_changed(self, ms):
+        self.length_ms = ms
+        self.on_time_changed(self.position_ms)
+
     def update_slider(self):
-        """Update slider position based on video progress"""
-        if not self.slider_pressed and self.player.is_playing():
-            media = self.player.get_media()
-            if media:
-                length = self.player.get_length()
-                position = self.player.get_time()
-
-                if length > 0:
-                    slider_pos = int((position / length) * 1000)
-                    self.position_slider.setValue(slider_pos)
-
-                    # Update time label
-                    current = self.format_time(position)
-                    total = self.format_time(length)
-                    self.time_label.setText(f"{current} / {total}")
+        """Update slider position and time label from the last reported VLC position"""
+        if self.slider_pressed or self.length_ms <= 0:
+            return
+        slider_pos = int((self.position_ms / self.length_ms) * 1000)
+        self.position_slider.setValue(slider_pos)
+
+        # Update time label
+        current = self.format_time(self.position_ms)
+        total = self.format_time(self.length_ms)
+        self.time_label.setText(f"{current} / {total}")
 
     def format_time(self, ms):
         """Format milliseconds to mm:ss.d"""
@@ -515,6 +606,7 @@ class VideoPlayer(QMainWindow):
         if length > 0:
             new_time = int((position / 1000) * length)
             self.player.set_time(new_time)
+            self.on_time_changed(new_time)
 
     def seek_to_timestamp(self, minutes, seconds):
         """Seek video to chosen timestamp"""
@@ -541,6 +633,7 @@ class VideoPlayer(QMainWindow):
         # verify timestamp is within video length and access the timestamp or show warning
         if length > 0 and timestamp <= length:
             self.player.set_time(timestamp)
+            self.on_time_changed(timestamp)
         elif timestamp > length:
             QMessageBox.warning(self, "Warning", "Please choose time within the video length")
             return
@@ -557,6 +650,7 @@ class VideoPlayer(QMainWindow):
         current_time = self.player.get_time()
         new_time = max(0, current_time + (seconds * 1000))
         self.player.set_time(int(new_time))
+        self.on_time_changed(int(new_time))    # no time event arrives while paused
 
     def change_speed(self, speed_text):
         """Change playback speed"""
@@ -568,7 +662,19 @@ class VideoPlayer(QMainWindow):
         super().showEvent(event)
         if not hasattr(self, '_embedded'):
             self._embedded = True
-            self.embed_video()
+            log_timing("window shown")
+
+    def paintEvent(self, event):
+        """After the first paint, start VLC (see finish_startup).
+        A zero-delay timer from showEvent can fire before the window is exposed and painted, so the
+        plugin scan in vlc.Instance() would hold up the first visible frame; a timer from here runs
+        once this paint has been flushed to the screen.
+        """
+        super().paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            log_timing("first paint")
+            QTimer.singleShot(0, self.finish_startup)
 
     def moveEvent(self, event):
         """Re-embed video when window is moved (fixes macOS multi-display issues)"""
@@ -597,6 +703,8 @@ class VideoPlayer(QMainWindow):
 
     def embed_video(self):
         """Embed VLC player into the Qt window"""
+        if self.player is None:
+            return
         if platform.system() == "Darwin":  # macOS
             self.player.set_nsobject(int(self.video_frame.winId()))
         elif platform.system() == "Windows":
@@ -626,6 +734,7 @@ class VideoPlayer(QMainWindow):
     def load_media(self, path):
         """Load media from file path or URL"""
         try:
+            self.finish_startup()
             media = self.instance.media_new(path)
             self.player.set_media(media)
             self.add_to_recent(path)
@@ -650,6 +759,10 @@ class VideoPlayer(QMainWindow):
         """Capture current frame as image and send to OCR
         As we are using
         """
+        requests = get_requests()
+        if self.player is None:
+            QMessageBox.warning(self, "Warning", "No video playing")
+            return
         if self.player.is_playing() or self.player.get_state() == vlc.State.Paused:
             # Pause if playing
             was_playing = self.player.is_playing()
@@ -658,7 +771,6 @@ class VideoPlayer(QMainWindow):
 
             try:
                 # Create temporary file for snapshot
-                import tempfile
                 with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
                     snapshot_path = tmp.name
 
@@ -666,11 +778,9 @@ class VideoPlayer(QMainWindow):
                 self.player.video_take_snapshot(0, snapshot_path, 0, 0)
 
                 # Wait a moment for snapshot to be written
-                import time
                 time.sleep(0.2)
 
                 # Send to OCR API
-                import requests
                 with open(snapshot_path, 'rb') as f:
                     files = {'file': ('frame.png', f, 'image/png')}
                     response = requests.post(
@@ -680,7 +790,6 @@ class VideoPlayer(QMainWindow):
                     )
 
                 # Clean up temp file
-                import os
                 os.unlink(snapshot_path)
 
                 # Display result
@@ -718,7 +827,8 @@ class VideoPlayer(QMainWindow):
 
     def closeEvent(self, event):
         """Clean up VLC player on close"""
-        self.player.stop()
+        if self.player is not None:
+            self.player.stop()
         self.timer.stop()
         event.accept()
 
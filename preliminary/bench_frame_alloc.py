@@ -0,0 +1,82 @@
+"""Measures memory allocated per frame on the way from the decoder to tesseract's input
+
+Each frame is read the way a server request does it, ie. from a video opened for that request, comparing:
+    - the old path: a new CodingVideo per request, decode to a new BGR array, convert to a new RGB array
+    - get_frame_grey on a new CodingVideo per request, so its reused buffers are new every time
+    - get_frame_grey on a video from open_video / close_video, as ocr_jobs.ocr_video_job and the API do,
+      so the same decoder and buffers serve request after request
+using tracemalloc. numpy registers its array memory with tracemalloc, so frame-sized arrays made by OpenCV
+show up too. tesseract itself isn't run. pytesseract still makes its own PIL image and temp PNG from whatever
+it is given; a grey frame makes those a third of the size.
+
+usage:  python -m preliminary.bench_frame_alloc resources/oop.mp4 [frames]
+Reference: https://docs.python.org/3/library/tracemalloc.html
+"""
+import sys
+import tracemalloc
+
+import cv2
+
+from preliminary.library_basics import CodingVideo, close_video, open_video
+
+
+def old_path(path: str, frame_number: int):
+    """get_frame_rgb_array as it was, on a new video: a new BGR frame, then a new RGB copy"""
+    video = CodingVideo(path)
+    try:
+        video.capture.set(cv2.CAP_PROP_POS_FRAMES, frame_number - 1)
+        ok, frame_bgr = video.capture.read()
+        return cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+    finally:
+        video.capture.release()
+
+
+def grey_new_video(path: str, frame_number: int):
+    video = CodingVideo(path)
+    try:
+        return video.get_frame_grey(frame_number).copy()
+    finally:
+        video.capture.release()
+
+
+def grey_reused_video(path: str, frame_number: int):
+    video = open_video(path)
+    try:
+        # copy, as a request would have finished with the buffer before handing the video back
+        return video.get_frame_grey(frame_number).copy()
+    finally:
+        close_video(video)
+
+
+def measure(label: str, read, path: str, frame_numbers: list[int]) -> None:
+    """Prints the average peak of new memory per frame, ie. roughly the bytes allocated for each frame"""
+    read(path, frame_numbers[0])        # the first read opens the reused video; don't count it
+    tracemalloc.start()
+    total = 0
+    for frame_number in frame_numbers:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        frame = read(path, frame_number)
+        _, peak = tracemalloc.get_traced_memory()
+        total += peak - current
+        del frame
+    tracemalloc.stop()
+    print(f"{label:<32} {total / len(frame_numbers) / 1e6:8.2f} MB new memory per frame")
+
+
+def main():
+    path = sys.argv[1]
+    video = CodingVideo(path)
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    step = max(1, video.frame_count // count)
+    frame_numbers = list(range(1, video.frame_count, step))[:count]
+    h, w = int(video.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(video.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    print(f"{video}  {w}x{h}, {len(frame_numbers)} frames; one BGR frame is {w * h * 3 / 1e6:.2f} MB")
+    video.capture.release()
+    measure("new video, BGR read + RGB", old_path, path, frame_numbers)
+    measure("new video, get_frame_grey", grey_new_video, path, frame_numbers)
+    measure("open_video, get_frame_grey", grey_reused_video, path, frame_numbers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Single-flight request coalescing
+
+When a class pauses the same lecture at the same moment, the server gets many identical requests at once.
+SingleFlight runs the work once per key, and every concurrent request for that key waits for and shares
+the one result. Later requests (after it finishes) start a new computation; this is not a cache.
+
+The shared computation runs in its own task, so it outlives any single waiter. Its is_disconnected check
+only reports True once every waiting client has gone, so one impatient client can't cancel the work
+for the rest (see ocr_jobs.WorkerPool.run).
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+# True (or a reason, as a str; see ocr_jobs.cancel_reason) once the client no longer wants the result
+IsDisconnected = Callable[[], Awaitable[bool | str]]
+
+
+class _Flight:
+    def __init__(self, is_disconnected: IsDisconnected):
+        self.waiters = [is_disconnected]
+        self.task: asyncio.Task | None = None
+
+    async def all_disconnected(self) -> bool | str:
+        """False while anyone is waiting; once all have gone, their reason if they all gave the same one"""
+        reasons = set()
+        for is_disconnected in self.waiters:
+            gone = await is_disconnected()
+            if not gone:
+                return False
+            reasons.add(gone)
+        return reasons.pop() if len(reasons) == 1 else True
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one computation"""
+    def __init__(self):
+        self._flights: dict[Hashable, _Flight] = {}
+        self.computed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[IsDisconnected], Awaitable[Any]],
+                 is_disconnected: IsDisconnected) -> Any:
+        """Returns await fn(all_disconnected), shared with any concurrent call for the same key.
+        fn receives a check that is True once every waiting client has disconnected.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            flight.waiters.append(is_disconnected)
+        else:
+            self.computed += 1
+            flight = self._flights[key] = _Flight(is_disconnected)
+            flight.task = asyncio.ensure_future(fn(flight.all_disconnected))
+            flight.task.add_done_callback(lambda _: self._flights.pop(key, None))
+        # shield: a waiter being cancelled must not cancel the shared task
+        return await asyncio.shield(flight.task)
+
+    def stats(self) -> dict:
+        return {"computed": self.computed, "coalesced": self.coalesced, "in_flight": len(self._flights)}
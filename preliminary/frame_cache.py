@@ -0,0 +1,161 @@
+"""Disk-backed cache of decoded video frames, shared between processes
+
+Each video gets a ring buffer of fixed-size frame slots in a numpy.memmap file, plus a small
+memmapped index saying which frame number is in each slot (-1 for empty).
+Every process keeps its own LRU of the slots it has used, but the frames themselves live in the
+OS page cache, so all uvicorn workers see each other's frames without growing their own heap.
+
+Writers (claiming and filling a slot) hold an exclusive flock on a `.lock` file next to the cache,
+readers a shared one while they copy a frame out, so two processes never claim the same slot and
+nobody reads a half-written frame. Threads within a process also share a threading.Lock, as flock
+doesn't tell them apart. Without fcntl (Windows) there is no cross-process locking, so use one worker there.
+
+Reference: https://numpy.org/doc/stable/reference/generated/numpy.memmap.html
+Reference: https://docs.python.org/3/library/fcntl.html#fcntl.flock
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+
+DEFAULT_SLOTS = 256
+
+# one cache object per (video, process), so per-request CodingVideo objects share the same LRU
+_caches: dict[str, "FrameCache"] = {}
+
+
+class FrameCache:
+    """
+    LRU cache of RGB frames for one video, in a memmapped ring of `slots` slots.
+    readonly: open an existing cache without ever writing to it (eg. for a reader-only worker).
+    """
+    def __init__(self, data_path: Path, shape: tuple[int, int, int], slots: int = DEFAULT_SLOTS,
+                 readonly: bool = False):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.readonly = readonly
+        index_path = data_path.with_suffix(".index")
+        self._thread_lock = threading.Lock()
+        self._lock_fd = _open_lock(data_path.with_suffix(".lock"), readonly)
+        if not readonly:
+            with self._locked(shared=False):    # re-checked under the lock, so only one process creates the files
+                if not _sized(data_path, slots * int(np.prod(self.shape))):
+                    _create(data_path, index_path, self.shape, slots)
+        mode = "r" if readonly else "r+"
+        self._data = np.memmap(data_path, dtype=np.uint8, mode=mode, shape=(slots, *self.shape))
+        self._index = np.memmap(index_path, dtype=np.int64, mode=mode, shape=(slots,))
+        self._lru: OrderedDict[int, int] = OrderedDict()   # frame number -> slot, oldest first
+        self._next_victim = 0
+        self.hits = self.misses = 0
+
+    @contextmanager
+    def _locked(self, shared: bool):
+        """Holds this process's thread lock, then the cross-process flock"""
+        with self._thread_lock:
+            if self._lock_fd is None:
+                yield
+                return
+            fcntl.flock(self._lock_fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def get(self, frame_number: int) -> np.ndarray | None:
+        """Returns a copy of the cached frame, or None"""
+        with self._locked(shared=True):
+            slot = self._lru.get(frame_number)
+            if slot is None or self._index[slot] != frame_number:
+                found = np.flatnonzero(self._index == frame_number)     # maybe another process cached it
+                if not len(found):
+                    self._lru.pop(frame_number, None)
+                    self.misses += 1
+                    return None
+                slot = int(found[0])
+            frame = np.array(self._data[slot])
+            self._lru[frame_number] = slot
+            self._lru.move_to_end(frame_number)
+            self.hits += 1
+            return frame
+
+    def put(self, frame_number: int, frame: np.ndarray) -> None:
+        """Stores a frame, evicting the least recently used slot if the ring is full"""
+        if self.readonly or frame.shape != self.shape:
+            return
+        with self._locked(shared=False):
+            slot = self._lru.get(frame_number)
+            if slot is not None and self._index[slot] == frame_number:
+                return
+            found = np.flatnonzero(self._index == frame_number)     # maybe another process cached it
+            if len(found):
+                self._lru[frame_number] = int(found[0])
+                return
+            slot = self._free_slot()
+            self._data[slot] = frame
+            self._index[slot] = frame_number
+            self._lru[frame_number] = slot
+
+    def _free_slot(self) -> int:
+        """Picks a slot to (re)use; called with the exclusive lock held"""
+        empty = np.flatnonzero(self._index == -1)
+        if len(empty):
+            return int(empty[0])
+        while self._lru:
+            frame_number, slot = self._lru.popitem(last=False)
+            # our LRU may be stale, ie. another process already reused that slot
+            if self._index[slot] == frame_number:
+                return slot
+        # every slot was filled by other processes: fall back to a simple clock
+        self._next_victim = (self._next_victim + 1) % self.slots
+        return self._next_victim
+
+
+def frame_cache_for(video_path: Path | str, shape: tuple[int, int, int], cache_dir: Path | str,
+                    slots: int = DEFAULT_SLOTS) -> FrameCache:
+    """Returns this process's FrameCache for a video, opening or creating the files as needed.
+    Files are keyed on the video's path, size and mtime, so an edited video never reuses stale frames.
+    """
+    video_path = Path(video_path).resolve()
+    stat = video_path.stat()
+    key = hashlib.sha1(f"{video_path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+    cache = _caches.get(key)
+    if cache is None or cache.shape != tuple(shape):
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        cache = _caches[key] = FrameCache(cache_dir / f"{key}.frames", shape, slots)
+    return cache
+
+
+def _open_lock(lock_path: Path, readonly: bool) -> int | None:
+    """File descriptor to flock, or None if locking isn't available"""
+    if fcntl is None:
+        return None
+    try:
+        return os.open(lock_path, os.O_RDONLY if readonly else os.O_RDWR | os.O_CREAT, 0o644)
+    except FileNotFoundError:   # readonly, and no writer has made one: nothing writes, so nothing to lock against
+        return None
+
+
+def _sized(path: Path, size: int) -> bool:
+    return path.is_file() and path.stat().st_size == size and path.with_suffix(".index").is_file()
+
+
+def _create(data_path: Path, index_path: Path, shape: tuple[int, ...], slots: int) -> None:
+    """Creates empty cache files, via rename so other processes never open half-made files"""
+    tmp_data = data_path.with_name(f"{data_path.name}.tmp{os.getpid()}")
+    tmp_index = index_path.with_name(f"{index_path.name}.tmp{os.getpid()}")
+    np.memmap(tmp_data, dtype=np.uint8, mode="w+", shape=(slots, *shape)).flush()
+    index = np.memmap(tmp_index, dtype=np.int64, mode="w+", shape=(slots,))
+    index[:] = -1
+    index.flush()
+    os.replace(tmp_index, index_path)
+    os.replace(tmp_data, data_path)
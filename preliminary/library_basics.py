@@ -12,17 +12,25 @@ Make sure you read the docstrings C.A.R.E.F.U.L.Y (yes, I took the L to check th
 """
 
 # imports - add all required imports here
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Generator
 import cv2
 import numpy as np
 from PIL import Image
 import pytesseract 
 
+if TYPE_CHECKING:
+    from preliminary.frame_cache import FrameCache
+
 # pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 # bad cert-iv
 
-from io import BytesIO
-
 # from https://pypi.org/project/pytesseract/
 # If you don't have tesseract executable in your PATH, include the following:
 # pytesseract.pytesseract.tesseract_cmd = r'<full_path_to_your_tesseract_executable>'
@@ -31,10 +39,35 @@ from io import BytesIO
 VID_PATH = Path("../resources/oop.mp4")
 PNG_PATH = Path("../test/test.png")
 
+# Incremental OCR tuning. A pixel counts as changed if its grey level moves by more than DIFF_TOLERANCE
+# (absorbs video compression noise); a row or column is blank if its grey levels span less than INK_CONTRAST.
+DIFF_TOLERANCE = 24
+INK_CONTRAST = 40
+BAND_MIN_GAP = 4
+COLUMN_MIN_GAP = 12
+
+# OCR latency tiers: tesseract engine mode (oem), page segmentation mode (psm), image scale and language.
+#   fast      - one uniform block of text (no layout analysis), greyscale, no dictionaries. For interactive use.
+#   balanced  - tesseract's defaults, same as plain image_to_string.
+#   accurate  - automatic layout, image upscaled 2x so small editor fonts come out cleaner. For background jobs.
+# Reference: https://tesseract-ocr.github.io/tessdoc/Command-Line-Usage.html
+OCR_TIERS = {
+    "fast": {"oem": 1, "psm": 6, "scale": 1.0, "lang": "eng", "grey": True,
+             "extra": "-c load_system_dawg=0 -c load_freq_dawg=0"},
+    "balanced": {"oem": 3, "psm": 3, "scale": 1.0, "lang": "eng", "grey": False, "extra": ""},
+    "accurate": {"oem": 1, "psm": 3, "scale": 2.0, "lang": "eng", "grey": True, "extra": ""},
+}
+# With a deadline, a slower tier gets this share of the remaining time before falling back to fast
+DEADLINE_SHARE = 2 / 3
+
+# Most idle CodingVideos (open decoders, with their frame buffers) kept per process by open_video
+IDLE_VIDEOS = 4
+
 class CodingVideo:
     capture: cv2.VideoCapture
 
     def __init__(self, video: Path | str):
+        self.path = video
         self.capture = cv2.VideoCapture(video)
         if not self.capture.isOpened():
             raise ValueError(f"Cannot open {video}")
@@ -42,6 +75,12 @@ class CodingVideo:
         self.fps = self.capture.get(cv2.CAP_PROP_FPS)
         self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
         self.duration = self.frame_count / self.fps
+        # last frame OCR'd in incremental mode: (grey frame, {(top, bottom): text})
+        self._previous_ocr: tuple[np.ndarray, dict[tuple[int, int], str]] | None = None
+        self.frame_cache: "FrameCache | None" = None
+        # decode and greyscale buffers, reused from frame to frame by the OCR path (see get_frame_grey)
+        self._bgr_buffer: np.ndarray | None = None
+        self._grey_buffer: np.ndarray | None = None
 
 
     def __str__(self) -> str:
@@ -63,13 +102,152 @@ class CodingVideo:
         """Returns a numpy N-dimensional array (ndarray)
         The array represents the RGB values of each pixel in a given frame
         Note: cv2 defaults to BGR format, so this function converts the color space to RGB
+        If a frame cache is enabled, recently decoded frames are read from it instead of decoded.
         """
+        if self.frame_cache is not None:
+            frame = self.frame_cache.get(frame_number)
+            if frame is not None:
+                return frame
+        frame_bgr = self._read_bgr(frame_number)
+        # convert colourspace
+        frame = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+        if self.frame_cache is not None:
+            self.frame_cache.put(frame_number, frame)
+        return frame
+
+    def get_frame_grey(self, frame_number: int) -> np.ndarray:
+        """Returns the frame as greyscale, ready for tesseract (which works in grey anyway).
+        Decodes into a reused BGR buffer and converts straight to a reused grey buffer, so after the first
+        frame there are no new frame-sized arrays and no RGB conversion.
+        With the frame cache enabled it goes through get_frame_rgb_array instead, so each frame costs
+        one new RGB array: a copy out of the cache on a hit, or a fresh decode and RGB conversion on a miss.
+        Note: the array is overwritten by the next call; copy it if you need to keep it.
+        """
+        if self.frame_cache is not None:
+            source, code = self.get_frame_rgb_array(frame_number), cv2.COLOR_RGB2GRAY
+        else:
+            source, code = self._read_bgr(frame_number), cv2.COLOR_BGR2GRAY
+        self._grey_buffer = cv2.cvtColor(source, code, dst=self._grey_buffer)
+        return self._grey_buffer
+
+    def _read_bgr(self, frame_number: int) -> np.ndarray:
+        """Seeks to the frame and decodes it into the reused BGR buffer"""
         self.capture.set(cv2.CAP_PROP_POS_FRAMES, frame_number - 1)  # jump to the frame
-        ret, frame_bgr = self.capture.read()
+        ret, frame_bgr = self.capture.read(self._bgr_buffer)
         if not ret:
             raise Exception("Error: Could not read the frame.")
-        # convert colourspace
-        return cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+        self._bgr_buffer = frame_bgr
+        return frame_bgr
+
+    def enable_frame_cache(self, cache_dir: Path | str, slots: int | None = None) -> None:
+        """Cache decoded frames in a memory-mapped ring buffer under cache_dir (see frame_cache.py).
+        The cache is shared by every CodingVideo for this file, in this and other processes.
+        slots: frames to keep; None for frame_cache.DEFAULT_SLOTS
+        """
+        shape = (int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        # imported here, so this file still runs as a script from preliminary/ (see test())
+        from preliminary.frame_cache import DEFAULT_SLOTS, frame_cache_for
+        self.frame_cache = frame_cache_for(self.path, shape, cache_dir, slots or DEFAULT_SLOTS)
+
+    def iter_frames(self, start_frame: int = 0, end_frame: int | None = None, step: int = 1):
+        """Yields (frame_number, RGB array) for every `step`-th frame in [start_frame, end_frame).
+        Seeks once, then reads sequentially: every frame is grab()'ed to keep the decoder going,
+        but only the sampled ones are retrieve()'d and colour converted.
+        Much cheaper than calling get_frame_rgb_array in a loop, which seeks for every frame.
+        """
+        if end_frame is None:
+            end_frame = self.frame_count
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        for frame_number in range(start_frame, end_frame):
+            if not self.capture.grab():
+                break
+            if (frame_number - start_frame) % step:
+                continue
+            ok, frame_bgr = self.capture.retrieve(self._bgr_buffer)
+            if not ok:
+                break
+            self._bgr_buffer = frame_bgr
+            yield frame_number, cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+
+    def map_frames(self, func: Callable[[np.ndarray], Any], interval: float = 1.0,
+                   workers: int | None = None) -> list[tuple[float, Any]]:
+        """Runs func(rgb_array) on one frame every `interval` seconds, across the whole video.
+        The video is split into contiguous segments, one per worker process. Each worker opens
+        its own capture, seeks once to the start of its segment, and decodes it sequentially.
+        Results are merged back as (seconds, result) in timestamp order.
+
+        func must be picklable, ie. a module level function such as pytesseract.image_to_string.
+        e.g.  video.map_frames(pytesseract.image_to_string, interval=5)
+
+        Reference: https://docs.python.org/3/library/concurrent.futures.html#processpoolexecutor
+        """
+        step = max(1, round(self.fps * interval))
+        workers = workers or os.cpu_count() or 1
+        segments = _segment_bounds(self.frame_count, step, workers)
+        with ProcessPoolExecutor(max_workers=len(segments) or 1, initializer=_init_segment_worker) as pool:
+            futures = [pool.submit(_process_segment, self.path, start, end, step, func)
+                       for start, end in segments]
+            # segments are submitted in order, so collecting in order keeps results sorted by time
+            results = [item for future in futures for item in future.result()]
+        return [(frame_number / self.fps, result) for frame_number, result in results]
+
+    def build_thumbnail_sprites(self, out_dir: Path, interval: float = 5.0, width: int = 160,
+                                columns: int = 10, rows: int = 10) -> dict:
+        """Builds seek-preview sprite sheets in one sequential pass over the video.
+        One thumbnail every `interval` seconds, scaled to `width` px wide, packed columns x rows per JPEG sheet.
+        Writes sheet_NNN.jpg, thumbnails.vtt and then index.json into out_dir, and returns the index.
+        Each file is written under a temporary name and renamed into place, and index.json comes last,
+        so once it exists the whole set is complete, even with several processes building at once.
+
+        The VTT uses media fragment (#xywh=) cues, as understood by most web players.
+        Reference: https://developer.mozilla.org/en-US/docs/Web/API/WebVTT_API
+        """
+        steps = self.thumbnail_steps(out_dir, interval, width, columns, rows)
+        while (index := next_step(steps)) is None:
+            pass
+        return index
+
+    def thumbnail_steps(self, out_dir: Path, interval: float = 5.0, width: int = 160,
+                        columns: int = 10, rows: int = 10) -> Generator[None, None, dict]:
+        """build_thumbnail_sprites one thumbnail at a time: a generator that yields after each thumbnail and
+        returns the index, so a caller can pause between thumbnails (eg. to let other work go first).
+        Use next_step to drive it.
+        """
+        out_dir.mkdir(parents=True, exist_ok=True)
+        step = max(1, round(self.fps * interval))
+        per_sheet = columns * rows
+        sheet = None
+        sheets: list[str] = []
+        times: list[float] = []
+        height = 0
+
+        def flush():
+            name = f"sheet_{len(sheets):03d}.jpg"
+            _write_replacing(out_dir / name, lambda tmp: Image.fromarray(sheet).save(tmp, "JPEG", quality=80))
+            sheets.append(name)
+
+        for frame_number, frame in self.iter_frames(step=step):
+            if not height:
+                height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+            index = len(times) % per_sheet
+            if index == 0:
+                if sheet is not None:
+                    flush()
+                sheet = np.zeros((rows * height, columns * width, 3), dtype=np.uint8)
+            y, x = divmod(index, columns)
+            sheet[y * height:(y + 1) * height, x * width:(x + 1) * width] = cv2.resize(
+                frame, (width, height), interpolation=cv2.INTER_AREA)
+            times.append(frame_number / self.fps)
+            yield
+        if sheet is not None:
+            flush()
+
+        index = {"interval": interval, "width": width, "height": height,
+                 "columns": columns, "rows": rows, "sheets": sheets, "times": times}
+        vtt = _thumbnails_vtt(index, self.duration)
+        _write_replacing(out_dir / "thumbnails.vtt", lambda tmp: tmp.write_text(vtt))
+        _write_replacing(out_dir / "index.json", lambda tmp: tmp.write_text(json.dumps(index)))
+        return index
 
     def get_image_as_bytes(self, seconds: int) -> bytes:
         """
@@ -84,6 +262,13 @@ class CodingVideo:
             raise ValueError("Failed to encode frame")
         return buf.tobytes()
 
+    def get_frame_png(self, frame_number: int) -> bytes:
+        """The frame as OCR sees it (greyscale), as lossless PNG bytes, eg. to send to an OCR worker node"""
+        ok, buf = cv2.imencode(".png", self.get_frame_grey(frame_number))
+        if not ok:
+            raise ValueError("Failed to encode frame")
+        return buf.tobytes()
+
     def save_as_image(self, seconds: int, output_path: Path | str = 'output.png') -> None:
       """Saves the given frame as a png image
        calculates frame number, extracts it as RGB using above f'n, save as PNG with PIL.
@@ -98,16 +283,342 @@ class CodingVideo:
       pillow_image = Image.fromarray(frame)
       pillow_image.save(output_path)
 
-    def get_text_from_frame(self, frame_number: int) -> str:
-        """OCR video frame using tesseract"""
-        frame = self.get_frame_rgb_array(frame_number)
+    def get_text_from_frame(self, frame_number: int, incremental: bool = False) -> str:
+        """OCR video frame using tesseract
+        incremental: only re-OCR the lines that changed since the previous incremental call on this video.
+        """
+        frame = self.get_frame_grey(frame_number)
+        if incremental:
+            return self.get_text_incremental(frame)
         return pytesseract.image_to_string(frame)
 
+    def get_text_incremental(self, frame: np.ndarray) -> str:
+        """OCR an RGB or grey frame, reusing text from the previous incremental call wherever it is unchanged.
+        The frame is split into tiles of text: column regions (eg. an IDE's side bar, editor and terminal),
+        each split into bands of text lines. Each tile is compared with the same area of the previous frame,
+        only new or changed tiles are sent to tesseract, all together in one pass, and the text is stitched
+        back in reading order. In a screen recording of someone typing, that is usually one or two lines
+        of one region per frame.
+
+        Note: the output is one line per text line, without the blank lines image_to_string adds
+        between paragraphs.
+        """
+        grey = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        tiles = _text_tiles(grey)
+
+        previous_texts: dict[tuple[int, int, int, int], str] = {}
+        changed = np.ones(len(tiles), dtype=bool)
+        if tiles and self._previous_ocr is not None and self._previous_ocr[0].shape == grey.shape:
+            previous_grey, previous_texts = self._previous_ocr
+            diff = np.abs(grey.astype(np.int16) - previous_grey) > DIFF_TOLERANCE
+            # summed area table, so each tile's count of changed pixels is four lookups
+            counts = np.zeros((grey.shape[0] + 1, grey.shape[1] + 1), dtype=np.int32)
+            np.cumsum(np.cumsum(diff, axis=0, dtype=np.int32), axis=1, out=counts[1:, 1:])
+            top, bottom, left, right = np.array(tiles, dtype=np.intp).T
+            changed = (counts[bottom, right] - counts[top, right] - counts[bottom, left] + counts[top, left]) > 0
+
+        texts = {tile: previous_texts[tile] for tile, dirty in zip(tiles, changed)
+                 if not dirty and tile in previous_texts}
+        texts.update(_ocr_tiles(grey, [tile for tile in tiles if tile not in texts]))
+
+        # keep a copy of the frame, reusing the previous one's memory when we can (grey may be a reused buffer)
+        if self._previous_ocr is not None and self._previous_ocr[0].shape == grey.shape:
+            np.copyto(self._previous_ocr[0], grey)
+            self._previous_ocr = (self._previous_ocr[0], texts)
+        else:
+            self._previous_ocr = (grey.copy(), texts)
+        return "\n".join(texts[tile] for tile in tiles if texts[tile])
+
+    def get_data_from_frame(self, frame_number: int) -> dict:
+        """OCR video frame, returning text plus word and line boxes (see ocr_data)"""
+        return ocr_data(self.get_frame_grey(frame_number))
+
+    def ocr_at_time(self, t: float, tier: str = "balanced", deadline: float | None = None,
+                    boxes: bool = False) -> tuple[str | dict, str, bool]:
+        """OCR video frame at given time, with a latency tier and optional deadline (see run_ocr)"""
+        return run_ocr(self.get_frame_grey(self.get_frame_number_at_time(t)), tier, deadline, boxes)
+
     def get_text_from_time(self, t: float) -> str:
         """OCR video frame, at given time"""
         return self.get_text_from_frame( self.get_frame_number_at_time(t))
 
 
+# idle CodingVideos by (path, mtime), least recently used first; see open_video
+_idle_videos: OrderedDict[tuple[str, int], list[CodingVideo]] = OrderedDict()
+_idle_videos_lock = threading.Lock()
+
+
+def open_video(path: Path | str, cache_dir: Path | str | None = None, cache_slots: int | None = None) -> CodingVideo:
+    """A CodingVideo for path, reusing an idle one from an earlier open_video if there is one, so
+    request after request uses the same open decoder and frame buffers instead of allocating new ones.
+    Give it back with close_video when done; until then it is yours alone, ie. not shared between threads.
+    Keyed on the file's mtime, so an edited video is reopened.
+    cache_dir: enable the frame cache on a newly opened video (see enable_frame_cache)
+    """
+    key = (str(Path(path).resolve()), os.stat(path).st_mtime_ns)
+    with _idle_videos_lock:
+        idle = _idle_videos.get(key)
+        video = idle.pop() if idle else None
+        if idle == []:
+            del _idle_videos[key]
+    if video is None:
+        video = CodingVideo(path)
+        if cache_dir:
+            video.enable_frame_cache(cache_dir, cache_slots)
+    video._idle_key = key
+    return video
+
+
+def close_video(video: CodingVideo) -> None:
+    """Returns a video from open_video for reuse, closing the least recently used idle videos
+    beyond IDLE_VIDEOS"""
+    video._previous_ocr = None      # incremental OCR state belongs to whoever used it last
+    evicted = []
+    with _idle_videos_lock:
+        _idle_videos.setdefault(video._idle_key, []).append(video)
+        _idle_videos.move_to_end(video._idle_key)
+        while sum(len(idle) for idle in _idle_videos.values()) > IDLE_VIDEOS:
+            key, idle = next(iter(_idle_videos.items()))
+            evicted.append(idle.pop(0))
+            if not idle:
+                del _idle_videos[key]
+    for old in evicted:
+        old.capture.release()
+
+
+def next_step(steps: Generator[None, None, Any]) -> Any:
+    """Runs a step generator (eg. CodingVideo.thumbnail_steps) to its next yield. Returns None if there
+    are more steps, or the generator's return value once it's done. Safe to call from another thread,
+    unlike next() whose StopIteration can't cross into a future."""
+    try:
+        next(steps)
+    except StopIteration as done:
+        return done.value
+    return None
+
+
+def _segment_bounds(frame_count: int, step: int, segments: int) -> list[tuple[int, int]]:
+    """Splits [0, frame_count) into at most `segments` contiguous (start, end) ranges.
+    Boundaries are multiples of step, so the sampled frames are the same as one sequential pass.
+    OpenCV doesn't expose the keyframe index, so each segment pays for one GOP of decoding on its seek;
+    keeping one segment per worker keeps that overhead to a handful of seeks per video.
+    """
+    samples = -(-frame_count // step)               # ceiling division
+    per_segment = -(-samples // max(1, segments)) * step
+    return [(start, min(start + per_segment, frame_count))
+            for start in range(0, frame_count, per_segment or 1)]
+
+
+def _empty_ocr_data() -> dict:
+    """ocr_data's result for an image with no text: every column present, and empty"""
+    columns = ("left", "top", "width", "height")
+    return {"text": "",
+            "words": {"text": [], **{c: [] for c in columns}, "conf": [], "line": []},
+            "lines": {c: [] for c in columns}}
+
+
+def ocr_data(image: np.ndarray, config: str = "", lang: str | None = None, timeout: float = 0) -> dict:
+    """Runs tesseract once, returning the text and the word and line boxes it came from.
+    Columnar, ie. parallel lists rather than a dict per word, which is smaller as JSON and gzips well:
+        {"text": "...",
+         "words": {"text": [...], "left": [...], "top": [...], "width": [...], "height": [...], "conf": [...], "line": [...]},
+         "lines": {"left": [...], "top": [...], "width": [...], "height": [...]}}
+    words.line is the index of the word's line in lines. Boxes are pixels from the top left of the image.
+
+    Reference: https://github.com/madmaze/pytesseract (image_to_data)
+               https://tesseract-ocr.github.io/tessdoc/Command-Line-Usage.html#tsv-output
+    """
+    data = pytesseract.image_to_data(image, lang=lang, config=config, timeout=timeout,
+                                     output_type=pytesseract.Output.DICT)
+    columns = ("left", "top", "width", "height")
+    result = _empty_ocr_data()
+    words, lines = result["words"], result["lines"]
+    line_index: dict[tuple[int, int, int], int] = {}
+    paragraphs: list[list[list[str]]] = []      # paragraph -> line -> words, to rebuild the text
+    last_paragraph = None
+
+    for i, word in enumerate(data["text"]):
+        if data["level"][i] != 5 or not word.strip():       # level 5 = word
+            continue
+        paragraph = (data["block_num"][i], data["par_num"][i])
+        key = (*paragraph, data["line_num"][i])
+        if key not in line_index:
+            line_index[key] = len(lines["left"])
+            for c in columns:
+                lines[c].append(data[c][i])
+            if paragraph != last_paragraph:
+                paragraphs.append([])
+                last_paragraph = paragraph
+            paragraphs[-1].append([])
+        else:       # grow the line's box to include this word
+            n = line_index[key]
+            right = max(lines["left"][n] + lines["width"][n], data["left"][i] + data["width"][i])
+            bottom = max(lines["top"][n] + lines["height"][n], data["top"][i] + data["height"][i])
+            lines["left"][n] = min(lines["left"][n], data["left"][i])
+            lines["top"][n] = min(lines["top"][n], data["top"][i])
+            lines["width"][n] = right - lines["left"][n]
+            lines["height"][n] = bottom - lines["top"][n]
+        paragraphs[-1][-1].append(word)
+        words["text"].append(word)
+        for c in columns:
+            words[c].append(data[c][i])
+        words["conf"].append(round(float(data["conf"][i])))
+        words["line"].append(line_index[key])
+
+    text = "\n\n".join("\n".join(" ".join(line) for line in paragraph) for paragraph in paragraphs)
+    return {"text": text, "words": words, "lines": lines}
+
+
+def run_ocr(image: np.ndarray, tier: str = "balanced", deadline: float | None = None,
+            boxes: bool = False) -> tuple[str | dict, str, bool]:
+    """OCR an RGB or greyscale image using one of OCR_TIERS.
+    deadline: a time.monotonic() value. A slower tier gets DEADLINE_SHARE of the time left; if tesseract
+              hasn't finished by then it is killed, and the fast tier gets the rest. If even that runs out,
+              the result is empty.
+    boxes: return ocr_data() output instead of a string.
+    returns (result, tier actually used, degraded) - degraded is True if the requested tier wasn't met.
+    """
+    if tier not in OCR_TIERS:
+        raise ValueError(f"Unknown OCR tier {tier!r}, expected one of {', '.join(OCR_TIERS)}")
+    attempts = [tier] if tier == "fast" or deadline is None else [tier, "fast"]
+    for i, attempt in enumerate(attempts):
+        timeout = 0
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            timeout = remaining * DEADLINE_SHARE if i < len(attempts) - 1 else remaining
+            if timeout <= 0:
+                continue
+        try:
+            return _run_tier(image, attempt, timeout, boxes), attempt, attempt != tier
+        except RuntimeError as e:      # pytesseract raises RuntimeError when it kills tesseract on timeout
+            if "timeout" not in str(e).lower():
+                raise
+    empty = _empty_ocr_data() if boxes else ""
+    return empty, tier, True
+
+
+def _run_tier(image: np.ndarray, tier: str, timeout: float, boxes: bool) -> str | dict:
+    settings = OCR_TIERS[tier]
+    if settings["grey"] and image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    if settings["scale"] != 1.0:
+        image = cv2.resize(image, None, fx=settings["scale"], fy=settings["scale"], interpolation=cv2.INTER_CUBIC)
+    config = f"--oem {settings['oem']} --psm {settings['psm']} {settings['extra']}".strip()
+    if boxes:
+        return ocr_data(image, config, settings["lang"], timeout)
+    return pytesseract.image_to_string(image, lang=settings["lang"], config=config, timeout=timeout)
+
+
+def _write_replacing(path: Path, write: Callable[[Path], Any]) -> None:
+    """write(tmp_path), then rename it over path, so readers see the old file or the whole new one"""
+    tmp = path.with_name(f"{path.name}.tmp{os.getpid()}-{threading.get_ident()}")
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _vtt_time(seconds: float) -> str:
+    mins, secs = divmod(seconds, 60)
+    hours, mins = divmod(int(mins), 60)
+    return f"{hours:02d}:{mins:02d}:{secs:06.3f}"
+
+
+def _thumbnails_vtt(index: dict, duration: float) -> str:
+    """WebVTT cues mapping each time range to its tile in a sprite sheet"""
+    per_sheet = index["columns"] * index["rows"]
+    width, height, times = index["width"], index["height"], index["times"]
+    cues = ["WEBVTT", ""]
+    for i, start in enumerate(times):
+        end = times[i + 1] if i + 1 < len(times) else duration
+        y, x = divmod(i % per_sheet, index["columns"])
+        cues += [f"{_vtt_time(start)} --> {_vtt_time(end)}",
+                 f"{index['sheets'][i // per_sheet]}#xywh={x * width},{y * height},{width},{height}", ""]
+    return "\n".join(cues)
+
+
+def _runs(inked: np.ndarray, min_gap: int) -> list[tuple[int, int]]:
+    """(start, end) runs of True in a 1D array, merging runs fewer than min_gap apart"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], inked.astype(np.int8), [0]))))
+    runs: list[tuple[int, int]] = []
+    for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+        if runs and start - runs[-1][1] < min_gap:
+            runs[-1] = (runs[-1][0], end)
+        else:
+            runs.append((start, end))
+    return runs
+
+
+def _text_tiles(grey: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """Splits a grey frame into (top, bottom, left, right) tiles of text, in reading order.
+    The frame is first split into column regions (eg. an IDE's file tree, editor and terminal) at runs
+    of blank columns at least COLUMN_MIN_GAP wide, then each region into bands of inked rows; bands
+    closer than BAND_MIN_GAP rows are merged so descenders and underlines stay with their line.
+    Tiles are listed region by region, left to right, each top to bottom.
+    """
+    tiles: list[tuple[int, int, int, int]] = []
+    inked_columns = (grey.max(axis=0).astype(np.int16) - grey.min(axis=0)) > INK_CONTRAST
+    for left, right in _runs(inked_columns, COLUMN_MIN_GAP):
+        region = grey[:, left:right]
+        inked_rows = (region.max(axis=1).astype(np.int16) - region.min(axis=1)) > INK_CONTRAST
+        tiles += [(top, bottom, left, right) for top, bottom in _runs(inked_rows, BAND_MIN_GAP)]
+    return tiles
+
+
+def _ocr_tiles(grey: np.ndarray, tiles: list[tuple[int, int, int, int]],
+               gap: int = 12) -> dict[tuple[int, int, int, int], str]:
+    """OCR several tiles of a grey frame with a single tesseract call.
+    Tiles are stacked into one image, left aligned and padded with the background colour, with
+    background spacers between them, and each recognised word is mapped back to its tile by its
+    vertical centre.
+
+    Reference: https://github.com/madmaze/pytesseract#quickstart (image_to_data)
+    """
+    if not tiles:
+        return {}
+    background = int(np.median(grey[::8, ::8]))
+    width = max(right - left for _, _, left, right in tiles)
+    height = gap + sum(bottom - top + gap for top, bottom, _, _ in tiles)
+    stacked = np.full((height, width), background, dtype=np.uint8)
+    offsets, y = [], gap
+    for top, bottom, left, right in tiles:
+        stacked[y:y + bottom - top, :right - left] = grey[top:bottom, left:right]
+        offsets.append(y)
+        y += bottom - top + gap
+    data = pytesseract.image_to_data(stacked, config="--psm 6", output_type=pytesseract.Output.DICT)
+
+    lines: dict[tuple[int, int, int, int], list[str]] = {}
+    for word, conf, top, height, block, par, line in zip(data["text"], data["conf"], data["top"], data["height"],
+                                                          data["block_num"], data["par_num"], data["line_num"]):
+        if float(conf) < 0 or not word.strip():
+            continue
+        # a word in the leading spacer (above the first tile) would give -1
+        tile = max(0, int(np.searchsorted(offsets, top + height / 2, side="right")) - 1)
+        lines.setdefault((tile, block, par, line), []).append(word)
+
+    texts = {tile: [] for tile in range(len(tiles))}
+    for (tile, *_), words in lines.items():       # dicts keep insertion order, ie. reading order
+        texts[tile].append(" ".join(words))
+    return {tiles[i]: "\n".join(text) for i, text in texts.items()}
+
+
+def _init_segment_worker():
+    """Stop each worker process from spawning its own thread pool, so N processes use ~N cores"""
+    cv2.setNumThreads(1)
+    os.environ["OMP_THREAD_LIMIT"] = "1"  # inherited by the tesseract subprocess
+
+
+def _process_segment(path: Path | str, start: int, end: int, step: int,
+                     func: Callable[[np.ndarray], Any]) -> list[tuple[int, Any]]:
+    """Worker side of CodingVideo.map_frames: decode one segment with a private capture handle"""
+    video = CodingVideo(path)
+    try:
+        return [(frame_number, func(frame)) for frame_number, frame in video.iter_frames(start, end, step)]
+    finally:
+        video.capture.release()
+
+
 class CodingFrame():
     """
     One frame for OCR. Construct from PNG bytes
@@ -115,17 +626,26 @@ class CodingFrame():
     _frame: np.ndarray
 
     def __init__(self, image_bytes: bytes):
-        # Open image with PIL from bytes
-        image = Image.open(BytesIO(image_bytes))
-        # Convert to RGB mode (pytesseract prefers RGB)
-        image = image.convert("RGB")
-        # Convert to numpy array
-        self._frame = np.array(image)
+        # Decode straight to a greyscale numpy array: tesseract works in grey, and this skips
+        # the PIL image, the RGB conversion and the copy into numpy.
+        # Reference: https://docs.opencv.org/4.x/d4/da8/group__imgcodecs.html#ga5a0acefe5cbe0a81e904e452ec7ca733
+        self._frame = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if self._frame is None:
+            raise ValueError("Could not decode image")
 
     def ocr(self) -> str:
         # returns OCR output as string, to be sent as JSON
         return pytesseract.image_to_string(self._frame)
 
+    def ocr_data(self) -> dict:
+        # returns text, word boxes and line boxes from one OCR pass, see ocr_data()
+        return ocr_data(self._frame)
+
+    def ocr_tiered(self, tier: str = "balanced", deadline: float | None = None,
+                   boxes: bool = False) -> tuple[str | dict, str, bool]:
+        # OCR with a latency tier and optional deadline, see run_ocr()
+        return run_ocr(self._frame, tier, deadline, boxes)
+
 
 
 def test():
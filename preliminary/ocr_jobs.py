@@ -0,0 +1,167 @@
+"""Runs OCR in worker processes that can be killed part way through a job
+
+If a player user seeks away or closes the app, nobody will read the OCR result, so there's no point
+finishing it. Each job runs in a pool process in its own process group; when the client disconnects or
+the request times out, the whole group (the worker and the tesseract process it started) is killed,
+and a fresh worker takes its place.
+
+Job functions must be module level (picklable). The ones the API uses are at the bottom of this file.
+
+Reference: https://docs.python.org/3/library/multiprocessing.html#contexts-and-start-methods
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from typing import Any, Awaitable, Callable
+
+REQUEST_TIMEOUT = float(os.environ.get("OCR_REQUEST_TIMEOUT", 60))
+POLL_INTERVAL = 0.05        # seconds between checks for a result, a disconnect, or a timeout
+KILL_TIMEOUT = 5            # seconds to wait for a killed worker to exit; it is a daemon, so never leaks past us
+
+# counts of jobs killed before they finished, by reason
+CANCELLED = {"disconnected": 0, "timeout": 0, "superseded": 0}
+
+
+class JobCancelled(Exception):
+    """The job was killed because its client went away ("disconnected"), took too long ("timeout"),
+    or was speculative and real work came along ("superseded", see prefetch.py)"""
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+async def cancel_reason(is_disconnected: Callable[[], Awaitable[bool | str]] | None) -> str | None:
+    """None while a job is still wanted, else why not. is_disconnected returns True once the client has
+    gone ("disconnected"), or a reason of its own as a str, eg. "superseded"."""
+    if is_disconnected is None:
+        return None
+    gone = await is_disconnected()
+    if not gone:
+        return None
+    return gone if isinstance(gone, str) else "disconnected"
+
+
+def _worker_main(conn) -> None:
+    """Worker process loop: receive (fn, args), send back (ok, result or exception)"""
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()        # own process group, so killing it also kills tesseract
+    import preliminary.library_basics  # noqa: F401  warm up cv2/numpy/pytesseract before the first job
+    while True:
+        try:
+            fn, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, fn(*args)))
+        except Exception as e:
+            try:
+                conn.send((False, e))
+            except Exception:       # exception wasn't picklable
+                conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except ProcessLookupError:
+            # killed before it got to setpgrp, so it has no group of its own yet (or it already exited)
+            self.process.kill()
+        self.process.join(timeout=KILL_TIMEOUT)
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    Pool of killable OCR worker processes, used from async request handlers.
+    Workers are started on demand, up to `size`.
+    """
+    def __init__(self, size: int | None = None):
+        self.size = size or os.cpu_count() or 1
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self._context = multiprocessing.get_context(method)
+        self._idle: list[_Worker] = []
+        self._started = 0
+        self._available: asyncio.Semaphore | None = None
+
+    async def run(self, fn: Callable[..., Any], *args,
+                  is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+                  timeout: float = REQUEST_TIMEOUT) -> Any:
+        """Runs fn(*args) in a worker, and returns its result.
+        is_disconnected: eg. starlette's request.is_disconnected, checked while the job runs.
+        Raises JobCancelled, after killing the worker, on disconnect or timeout.
+        """
+        if self._available is None:
+            self._available = asyncio.Semaphore(self.size)
+        async with self._available:
+            # the client may have left while we queued: don't send (and then kill) a warm worker for nobody
+            if reason := await cancel_reason(is_disconnected):
+                CANCELLED[reason] += 1
+                raise JobCancelled(reason)
+            worker = self._idle.pop() if self._idle else await asyncio.to_thread(self._start_worker)
+            try:
+                ok, value = await self._wait(worker, fn, args, is_disconnected, time.monotonic() + timeout)
+            except BaseException as e:     # cancelled, or the worker broke: don't reuse it
+                worker.kill()
+                self._started -= 1
+                if isinstance(e, JobCancelled):
+                    CANCELLED[e.reason] += 1
+                raise
+            self._idle.append(worker)
+        if not ok:
+            raise value
+        return value
+
+    def _start_worker(self) -> _Worker:
+        self._started += 1
+        return _Worker(self._context)
+
+    @staticmethod
+    async def _wait(worker: _Worker, fn, args, is_disconnected, deadline: float) -> tuple[bool, Any]:
+        worker.conn.send((fn, args))
+        while not worker.conn.poll():
+            if reason := await cancel_reason(is_disconnected):
+                raise JobCancelled(reason)
+            if time.monotonic() > deadline:
+                raise JobCancelled("timeout")
+            await asyncio.sleep(POLL_INTERVAL)
+        return worker.conn.recv()
+
+    def stats(self) -> dict:
+        return {"size": self.size, "started": self._started, "idle": len(self._idle)}
+
+    def close(self) -> None:
+        while self._idle:
+            self._idle.pop().kill()
+
+
+############ Job functions, run inside the workers ############
+
+def ocr_video_job(path: str, t: float, tier: str, deadline: float | None, boxes: bool,
+                  cache_dir: str | None = None, cache_slots: int = 0) -> tuple[str | dict, str, bool]:
+    """OCR the frame of a video at time t; returns run_ocr's (result, tier, degraded).
+    The video stays open in the worker between jobs, so its decoder and frame buffers are reused."""
+    from preliminary.library_basics import open_video, close_video
+    coding_video = open_video(path, cache_dir, cache_slots)
+    try:
+        return coding_video.ocr_at_time(t, tier, deadline, boxes)
+    finally:
+        close_video(coding_video)
+
+
+def ocr_image_job(image_bytes: bytes, tier: str, deadline: float | None,
+                  boxes: bool) -> tuple[str | dict, str, bool]:
+    """OCR an uploaded image; returns run_ocr's (result, tier, degraded)"""
+    from preliminary.library_basics import CodingFrame
+    return CodingFrame(image_bytes).ocr_tiered(tier, deadline, boxes)
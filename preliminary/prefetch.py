@@ -0,0 +1,99 @@
+"""Speculative prefetch of the frames a player is likely to ask for next
+
+Player users mostly move with the fixed skip buttons (5 s and 30 s by default), so after a request for
+time t the next one is very likely at t +/- one of those. Prefetcher works those out in the background,
+into a small LRU of finished responses, so the next skip-and-capture is answered from memory.
+
+It is low priority: it only runs while no real requests are being served, one item at a time, and
+a new request replaces whatever was still queued. Work is done through SingleFlight with an
+is_disconnected check that reports "superseded" whenever real demand arrives, so a running prefetch
+OCR job is killed then (and counted under that reason, not as a client disconnecting). Prefetch flights are keyed apart from real ones (("prefetch", key)), so a real request
+never joins one: it would be stuck with a background priority job, run without its deadline.
+Only finished results are shared, through get().
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from preliminary.coalesce import SingleFlight
+
+# (key, fn) - key as used for get(), fn(is_disconnected) computes the value; None means don't cache it
+PrefetchItem = tuple[Hashable, Callable[[Callable[[], Awaitable[bool]]], Awaitable[Any]]]
+
+
+class Prefetcher:
+    def __init__(self, flights: SingleFlight, max_entries: int = 32):
+        self.flights = flights
+        self.max_entries = max_entries
+        self._cache: OrderedDict[Hashable, Any] = OrderedDict()
+        self._queue: list[PrefetchItem] = []
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: asyncio.Task | None = None
+        self.hits = self.prefetched = self.abandoned = 0
+
+    def demand(self) -> "_Demand":
+        """Context manager around each real request, so prefetching backs off while it runs"""
+        return _Demand(self)
+
+    def get(self, key: Hashable) -> Any | None:
+        value = self._cache.get(key)
+        if value is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def schedule(self, items: list[PrefetchItem]) -> None:
+        """Replace the queue with new predictions, nearest first"""
+        self._queue = [item for item in items if item[0] not in self._cache]
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _demand_arrived(self) -> bool | str:
+        # a reason rather than True, so killed prefetches aren't counted as clients disconnecting
+        return "superseded" if self._active > 0 else False
+
+    async def _run(self) -> None:
+        while self._queue:
+            await self._idle.wait()
+            if not self._queue:
+                return
+            key, fn = self._queue.pop(0)
+            if key in self._cache:
+                continue
+            try:
+                value = await self.flights.do(("prefetch", key), fn, self._demand_arrived)
+            except Exception:       # killed by real demand, or failed; it was only a guess
+                self.abandoned += 1
+                continue
+            if value is not None:
+                self._cache[key] = value
+                self._cache.move_to_end(key)
+                self.prefetched += 1
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "prefetched": self.prefetched, "abandoned": self.abandoned,
+                "cached": len(self._cache), "queued": len(self._queue)}
+
+
+class _Demand:
+    def __init__(self, prefetcher: Prefetcher):
+        self.prefetcher = prefetcher
+
+    def __enter__(self):
+        self.prefetcher._active += 1
+        self.prefetcher._idle.clear()
+
+    def __exit__(self, *exc):
+        self.prefetcher._active -= 1
+        if not self.prefetcher._active:
+            self.prefetcher._idle.set()
+
+
+def neighbour_times(t: float, skips: list[float], duration: float) -> list[float]:
+    """Times one skip away from t in either direction, nearest (ie. most likely) first"""
+    times = [t + sign * skip for skip in sorted(skips) for sign in (1, -1)]
+    return [time for time in times if 0 <= time <= duration]
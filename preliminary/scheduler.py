@@ -0,0 +1,123 @@
+"""Priority scheduler for decode and OCR work
+
+All decode and OCR work in the API takes a slot from here first. There are as many slots as there are
+OCR workers jobs go to (the live worker nodes' capacity, or the local pool if there are none), and
+three priority classes:
+
+    interactive - a player user waiting for a frame or OCR right now
+    batch       - bulk jobs, eg. whole-video OCR or building thumbnails
+    background  - speculative work, eg. prefetch
+
+A free slot always goes to the highest class with anyone waiting. Within a class, clients take turns
+(round robin), so one client's 500-frame batch job can't starve another's. Lower classes are also capped:
+batch may use all but one slot, background a quarter, so with two or more slots one is always kept free for
+interactive work. With a single slot (eg. OCR_WORKERS=1) batch and background still get it, one job at a
+time; interactive work then waits for that job to finish, but still goes ahead of any other queued work.
+Bulk jobs take one slot per frame, so they yield to interactive requests at frame granularity.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Callable, Literal
+
+Priority = Literal["interactive", "batch", "background"]
+PRIORITIES: tuple[Priority, ...] = ("interactive", "batch", "background")
+
+
+class _ClassStats:
+    def __init__(self):
+        self.running = 0
+        self.granted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class Scheduler:
+    """
+    capacity: fn returning the current number of slots (it changes as worker nodes come and go)
+    """
+    def __init__(self, capacity: Callable[[], int]):
+        self.capacity = capacity
+        # per class: client -> waiting futures, in arrival order. Clients rotate to the back when served.
+        self._queues: dict[str, OrderedDict[str, deque[tuple[asyncio.Future, float]]]] = {
+            priority: OrderedDict() for priority in PRIORITIES}
+        self._stats = {priority: _ClassStats() for priority in PRIORITIES}
+
+    def _limit(self, priority: Priority) -> int:
+        slots = max(1, self.capacity())
+        if priority == "interactive":
+            return slots
+        if priority == "batch":
+            return max(1, slots - 1)
+        return max(1, slots // 4)
+
+    def _in_use(self) -> int:
+        return sum(stats.running for stats in self._stats.values())
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, client: str):
+        """Waits for, holds, and then releases a work slot"""
+        await self._acquire(priority, client)
+        try:
+            yield
+        finally:
+            self._stats[priority].running -= 1
+            self._dispatch()
+
+    async def _acquire(self, priority: Priority, client: str) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(client, deque()).append((future, time.monotonic()))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():   # granted just as we were cancelled: hand it back
+                self._stats[priority].running -= 1
+                self._dispatch()
+            else:
+                self._forget(priority, client, future)
+            raise
+
+    def _forget(self, priority: Priority, client: str, future: asyncio.Future) -> None:
+        waiters = self._queues[priority].get(client)
+        if waiters is not None:
+            for item in waiters:
+                if item[0] is future:
+                    waiters.remove(item)
+                    break
+            if not waiters:
+                del self._queues[priority][client]
+
+    def _dispatch(self) -> None:
+        """Grant free slots: highest class first, round robin between clients within a class"""
+        for priority in PRIORITIES:
+            queue, stats = self._queues[priority], self._stats[priority]
+            while queue and self._in_use() < self.capacity() and stats.running < self._limit(priority):
+                client, waiters = next(iter(queue.items()))
+                future, queued_at = waiters.popleft()
+                if waiters:
+                    queue.move_to_end(client)
+                else:
+                    del queue[client]
+                if future.done():       # cancelled while queued
+                    continue
+                wait = time.monotonic() - queued_at
+                stats.running += 1
+                stats.granted += 1
+                stats.total_wait += wait
+                stats.max_wait = max(stats.max_wait, wait)
+                future.set_result(None)
+            if queue:
+                return      # this class is still waiting, so nothing lower may jump ahead of it
+
+    def stats(self) -> dict:
+        """Per class: queued requests, running jobs, jobs granted, and wait times in seconds"""
+        return {"slots": self.capacity(), **{
+            priority: {"queued": sum(len(waiters) for waiters in self._queues[priority].values()),
+                       "clients_queued": len(self._queues[priority]),
+                       "running": stats.running,
+                       "granted": stats.granted,
+                       "mean_wait": stats.total_wait / stats.granted if stats.granted else 0.0,
+                       "max_wait": stats.max_wait}
+            for priority, stats in self._stats.items()}}
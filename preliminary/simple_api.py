@@ -3,14 +3,75 @@
 
 Drive the API to complete "interprocess communication"
 Requirements
+
+Start up: the OCR libraries (cv2, numpy, PIL, pytesseract) are imported lazily, and warmed up in a
+background thread once the server is listening, so /health answers straight away.
+Set OCR_STARTUP_TIMING=1 to print import and initialisation timings to stderr.
 """
-from fastapi import FastAPI, HTTPException
+import time
+_started = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
+import functools
+import hashlib
+from typing import TYPE_CHECKING, Literal
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi import File, UploadFile
 from fastapi import Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from pathlib import Path
-from preliminary.library_basics import CodingVideo, CodingFrame
-app = FastAPI()
+import json
+import math
+import os
+import sys
+import threading
+from preliminary.coalesce import SingleFlight
+from preliminary.prefetch import Prefetcher, neighbour_times
+from preliminary.scheduler import Scheduler, Priority
+from preliminary.ocr_jobs import WorkerPool, JobCancelled, CANCELLED, ocr_video_job, ocr_image_job
+from preliminary.worker_registry import WorkerRegistry, authorized
+if TYPE_CHECKING:
+    from preliminary.library_basics import CodingVideo
+
+STARTUP_TIMING = os.environ.get("OCR_STARTUP_TIMING") == "1"
+_library = None
+_library_lock = threading.Lock()
+
+
+def _log_timing(what: str, since: float) -> None:
+    if STARTUP_TIMING:
+        print(f"[startup] {what}: {(time.perf_counter() - since) * 1000:.0f} ms", file=sys.stderr)
+
+
+def _lib():
+    """Returns preliminary.library_basics, importing it (and cv2, numpy, PIL, pytesseract) on first use"""
+    global _library
+    if _library is None:
+        with _library_lock:
+            if _library is None:
+                started = time.perf_counter()
+                import preliminary.library_basics as library
+                _log_timing("import library_basics (cv2, numpy, PIL, pytesseract)", started)
+                _library = library
+    return _library
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _log_timing("import simple_api", _started)
+    threading.Thread(target=_lib, name="ocr-warm-up", daemon=True).start()
+    yield
+    ocr_pool.close()
+    await workers.close()
+
+
+app = FastAPI(lifespan=lifespan)
+# OCR results with boxes are mostly numbers, and compress well
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # We'll create a lightweight "database" for our videos
 # You can add uploads later (not required for assessment)
@@ -19,12 +80,118 @@ VIDEOS: dict[str, Path] = {
     "demo": Path("resources/oop.mp4")
 }
 
+# Sprite sheets are built once per video and interval, then served as static files.
+# Intervals are rounded to 0.1 s and at least THUMBNAIL_MIN_INTERVAL, so the number of cached sets stays bounded.
+THUMBNAIL_DIR = Path("resources/thumbnails")
+THUMBNAIL_MIN_INTERVAL = 1.0
+THUMBNAIL_DIR.mkdir(parents=True, exist_ok=True)
+app.mount("/thumbnails", StaticFiles(directory=THUMBNAIL_DIR), name="thumbnails")
+# one build at a time in this process; other uvicorn workers may build the same set at once, which only
+# wastes work, as files are renamed into place with index.json last (see CodingVideo.thumbnail_steps)
+_thumbnail_lock = asyncio.Lock()
+
+# Optional decoded-frame cache, shared by all uvicorn workers, eg.
+#   OCR_FRAME_CACHE_DIR=/tmp/ocr-frames OCR_FRAME_CACHE_SLOTS=256 fastapi run preliminary/simple_api.py --workers 4
+FRAME_CACHE_DIR = os.environ.get("OCR_FRAME_CACHE_DIR")
+FRAME_CACHE_SLOTS = int(os.environ.get("OCR_FRAME_CACHE_SLOTS", 256))
+
+# OCR runs in killable worker processes, so work for clients that have gone away can be stopped
+ocr_pool = WorkerPool(int(os.environ.get("OCR_WORKERS", 0)) or None)
+# remote OCR worker nodes; used in preference to the local pool whenever any are registered
+workers = WorkerRegistry()
+# identical concurrent frame / OCR requests share one computation
+flights = SingleFlight()
+
+# After a frame or OCR request for time t, work out t +/- the player's skip intervals in the background.
+#   OCR_PREFETCH_SKIPS="5,30" (empty to turn off), OCR_PREFETCH_OCR=1 to OCR them too, not just decode them
+PREFETCH_SKIPS = [float(skip) for skip in os.environ.get("OCR_PREFETCH_SKIPS", "5,30").split(",") if skip.strip()]
+PREFETCH_OCR = os.environ.get("OCR_PREFETCH_OCR") == "1"
+prefetcher = Prefetcher(flights, int(os.environ.get("OCR_PREFETCH_CACHE_SIZE", 32)))
+
+def _ocr_slots() -> int:
+    """One slot per OCR worker that jobs actually go to: the remote nodes' if any are live, else the local pool"""
+    remote = sum(worker.capacity for worker in workers.live())
+    return remote or ocr_pool.size
+
+# every decode / OCR job takes a slot, by priority class
+scheduler = Scheduler(_ocr_slots)
+
+OcrTier = Literal["fast", "balanced", "accurate"]
+
+# whole-video OCR (GET /video/{vid}/ocr) samples at most one frame a second, so one request can't queue
+# an unbounded number of batch jobs
+VIDEO_OCR_MIN_INTERVAL = 1.0
+
+
+def _deadline(started: float, deadline: float | None) -> float | None:
+    """Converts a request's deadline (seconds, from when it arrived) to a time.monotonic() value"""
+    return None if deadline is None else started + deadline
+
+
+def _client_id(request: Request) -> str:
+    """Who a request is from, for fair queuing. Clients behind one proxy can set X-Client-Id."""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+
+def _scheduled(compute, priority: Priority, client: str):
+    """Wraps an async fn(is_disconnected) so it only runs once the scheduler gives it a slot"""
+    async def run(is_disconnected):
+        async with scheduler.slot(priority, client):
+            return await compute(is_disconnected)
+    return run
+
+
+def _ocr_compute(remote, job, *args):
+    """An async fn(is_disconnected) that runs an OCR job on a remote worker node if there are any,
+    else in the local worker pool. Either way the job is killed if is_disconnected() becomes True.
+    remote: async fn(is_disconnected) sending the job to workers.dispatch; returns None if no node could run it.
+    """
+    async def run(is_disconnected):
+        if workers.live():
+            result = await remote(is_disconnected)
+            if result is not None:
+                return result
+        return await ocr_pool.run(job, *args, is_disconnected=is_disconnected)
+    return run
+
+
+async def _run_ocr_job(request: Request, response: Response, key: tuple, compute, cache_key: tuple | None = None):
+    """Runs an OCR computation for a request, killing it if the client disconnects or it times out.
+    Answered from the prefetch cache (under cache_key) if possible. Concurrent requests with the same key
+    share one job, which is only killed once they have all disconnected.
+    """
+    try:
+        with prefetcher.demand():
+            result, used_tier, degraded = ((cache_key is not None and prefetcher.get(cache_key))
+                                           or await flights.do(key, compute, request.is_disconnected))
+    except JobCancelled as e:
+        if e.reason == "timeout":
+            raise HTTPException(status_code=504, detail="OCR timed out")
+        return Response(status_code=499)     # client closed request; nobody is listening
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _ocr_headers(response, used_tier, degraded)
+    return result
+
+
+def _ocr_headers(response: Response, tier: str, degraded: bool) -> None:
+    """Tells the client which tier actually produced the text, without changing the body's shape"""
+    response.headers["X-OCR-Tier"] = tier
+    response.headers["X-OCR-Degraded"] = "true" if degraded else "false"
+
+
 class VideoMetaData(BaseModel):
     fps: float
     frame_count: int
     duration_seconds: float
     _links: dict | None = None
 
+@app.get("/health")
+def health():
+    """Liveness check. ocr_ready is false until the OCR libraries have finished loading."""
+    return {"status": "ok", "ocr_ready": _library is not None}
+
+
 @app.get("/video")
 def list_videos():
     """List all available videos with HATEOAS-style links."""
@@ -36,23 +203,116 @@ def list_videos():
                 "path": str(path), # Not standard for debug only
                 "_links": {
                     "self": f"/video/{vid}",
-                    "frame_example": f"/video/{vid}/frame/1.0"
+                    "frame_example": f"/video/{vid}/frame/1.0",
+                    "thumbnails": f"/video/{vid}/thumbnails"
                 }
             }
             for vid, path in VIDEOS.items()
         ]
     }
 
-def _open_vid_or_404(vid: str) -> CodingVideo:
+def _video_path_or_404(vid: str) -> Path:
     path = VIDEOS.get(vid)
     if not path or not path.is_file():
         raise HTTPException(status_code=404, detail=f"Video '{path}' not found")
+    return path
+
+def _open_vid_or_404(vid: str) -> "CodingVideo":
+    path = _video_path_or_404(vid)
     try:
-        return CodingVideo(path)
+        coding_video = _lib().CodingVideo(path)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Could not open video {e}")
+    if FRAME_CACHE_DIR:
+        coding_video.enable_frame_cache(FRAME_CACHE_DIR, FRAME_CACHE_SLOTS)
+    return coding_video
 
-def _meta(video: CodingVideo) -> VideoMetaData:
+@functools.lru_cache(maxsize=64)
+def _video_timing(path: Path, mtime_ns: int) -> tuple[float, float]:
+    """(fps, duration) of a video, cached until the file changes"""
+    coding_video = _lib().CodingVideo(path)
+    try:
+        return coding_video.fps, coding_video.duration
+    finally:
+        coding_video.capture.release()
+
+async def _timing(path: Path) -> tuple[float, float]:
+    return await run_in_threadpool(_video_timing, path, path.stat().st_mtime_ns)
+
+async def _frame_number(path: Path, t: float) -> int:
+    """Frame number at time t, as CodingVideo.get_frame_number_at_time, without opening the video each time"""
+    fps, _ = await _timing(path)
+    return round(fps * t)
+
+def _borrow_vid_or_404(vid: str) -> "CodingVideo":
+    """Like _open_vid_or_404, but reuses an idle open video; hand it back with _lib().close_video"""
+    path = _video_path_or_404(vid)
+    try:
+        return _lib().open_video(path, FRAME_CACHE_DIR, FRAME_CACHE_SLOTS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not open video {e}")
+
+def _frame_png(vid: str, frame_number: int) -> bytes:
+    coding_video = _borrow_vid_or_404(vid)
+    try:
+        return coding_video.get_frame_png(frame_number)
+    finally:
+        _lib().close_video(coding_video)
+
+def _frame_image(vid: str, timestamp: float) -> bytes:
+    coding_video = _borrow_vid_or_404(vid)
+    try:
+        return coding_video.get_image_as_bytes(timestamp)
+    finally:
+        _lib().close_video(coding_video)
+
+def _frame_compute(vid: str, timestamp: float):
+    """async fn(is_disconnected) returning the PNG for /video/{vid}/frame/{timestamp}"""
+    async def run(_is_disconnected):
+        return await run_in_threadpool(_frame_image, vid, timestamp)
+    return run
+
+def _video_ocr_compute(vid: str, path: Path, t: float, frame_number: int, tier: str, deadline: float | None,
+                       boxes: bool):
+    """async fn(is_disconnected) returning (result, tier, degraded) for /video/{vid}/frame/{t}/ocr"""
+    async def remote(is_disconnected):
+        # worker nodes may not have the video, so decode here and send them the frame
+        png = await run_in_threadpool(_frame_png, vid, frame_number)
+        return await workers.dispatch(png, tier, deadline, boxes, is_disconnected)
+    return _ocr_compute(remote, ocr_video_job, str(path), t, tier, deadline, boxes, FRAME_CACHE_DIR, FRAME_CACHE_SLOTS)
+
+def _warm_frame_cache(vid: str, frame_number: int) -> None:
+    coding_video = _borrow_vid_or_404(vid)
+    try:
+        coding_video.get_frame_rgb_array(frame_number)
+    finally:
+        _lib().close_video(coding_video)
+
+async def _prefetch_around(vid: str, path: Path, t: float, ocr_options: tuple | None = None) -> None:
+    """Queue prefetching of the frames one skip either side of t.
+    ocr_options: (tier, boxes) of an OCR request. Its neighbours are OCR'd with the same options if
+    OCR_PREFETCH_OCR is set, otherwise just decoded into the frame cache (if there is one).
+    Keys leave out the deadline: a prefetched result has no deadline, so it suits a request with any.
+    """
+    fps, duration = await _timing(path)
+    items = []
+    for near in neighbour_times(t, PREFETCH_SKIPS, duration):
+        frame_number = round(fps * near)
+        if ocr_options is None:
+            items.append((("frame", vid, frame_number), _frame_compute(vid, near)))
+        elif PREFETCH_OCR:
+            tier, boxes = ocr_options
+            # no deadline: nobody is waiting yet, so take the time to do the requested tier properly
+            items.append((("ocr", vid, frame_number, tier, boxes),
+                          _video_ocr_compute(vid, path, near, frame_number, tier, None, boxes)))
+        elif FRAME_CACHE_DIR:
+            async def warm(_is_disconnected, frame_number=frame_number):
+                await run_in_threadpool(_warm_frame_cache, vid, frame_number)
+            items.append((("decode", vid, frame_number), warm))
+    if items:
+        prefetcher.schedule([(key, _scheduled(compute, "background", "prefetch")) for key, compute in items])
+
+def _meta(video: "CodingVideo") -> VideoMetaData:
     return VideoMetaData(
             fps=video.fps,
             frame_count=video.frame_count,
@@ -74,39 +334,184 @@ def video(vid: str):
         coding_video.capture.release()
 
 
+def _thumbnail_index(vid: str, out_dir: Path) -> dict | None:
+    """The cached sprite sheet index, or None if it's missing or older than the video"""
+    index_path = out_dir / "index.json"
+    path = VIDEOS.get(vid)
+    if index_path.is_file() and path and path.is_file() and index_path.stat().st_mtime >= path.stat().st_mtime:
+        return json.loads(index_path.read_text())
+    return None
+
+async def _build_thumbnails(vid: str, interval: float, out_dir: Path, client: str) -> dict:
+    """Builds the sprite sheets as a batch job, taking a scheduler slot per thumbnail so that
+    interactive requests get in between thumbnails rather than waiting for the whole pass"""
+    async with _thumbnail_lock:
+        index = _thumbnail_index(vid, out_dir)    # maybe built while we waited
+        if index is not None:
+            return index
+        coding_video = await run_in_threadpool(_open_vid_or_404, vid)
+        try:
+            steps = coding_video.thumbnail_steps(out_dir, interval)
+            while index is None:
+                async with scheduler.slot("batch", client):
+                    index = await run_in_threadpool(_lib().next_step, steps)
+        finally:
+            coding_video.capture.release()
+    return index
+
+
+@app.get("/video/{vid}/thumbnails")
+async def video_thumbnails(vid: str, request: Request, interval: float = 5.0):
+    """
+    Index of seek-preview sprite sheets, one thumbnail every `interval` seconds
+    (rounded to 0.1 s, at least THUMBNAIL_MIN_INTERVAL).
+    Built on first request (one pass over the video, as a batch job), then cached on disk under /thumbnails.
+    returns the index as JSON, with links to the sheets and a WebVTT track.
+    """
+    interval = round(interval, 1)
+    if not math.isfinite(interval) or interval < THUMBNAIL_MIN_INTERVAL:
+        raise HTTPException(status_code=400, detail=f"interval must be at least {THUMBNAIL_MIN_INTERVAL:g} seconds")
+    _video_path_or_404(vid)
+    out_dir = THUMBNAIL_DIR / vid / f"{interval:.1f}s"
+    base = f"/thumbnails/{vid}/{interval:.1f}s"
+    index = _thumbnail_index(vid, out_dir) or await _build_thumbnails(vid, interval, out_dir, _client_id(request))
+    index["sheets"] = [f"{base}/{name}" for name in index["sheets"]]
+    index["_links"] = {"self": f"/video/{vid}/thumbnails?interval={interval:.1f}",
+                       "vtt": f"{base}/thumbnails.vtt"}
+    return index
+
+
 @app.get("/video/{vid}/frame/{timestamp}", response_class=Response)
-def video_frame(vid: str, timestamp: float):
+async def video_frame(vid: str, timestamp: float, request: Request):
     """
     vid: name of video as returned by /video endpoint
     timestamp:  in seconds, to find frame
     returns a PNG frame. (not json)
     """
+    path = _video_path_or_404(vid)
+    key = ("frame", vid, await _frame_number(path, timestamp))
+    with prefetcher.demand():
+        compute = _scheduled(_frame_compute(vid, timestamp), "interactive", _client_id(request))
+        png = prefetcher.get(key) or await flights.do(key, compute, request.is_disconnected)
+    await _prefetch_around(vid, path, timestamp)
+    return Response(content=png, media_type="image/png")
+
+
+@app.get("/metrics")
+def metrics():
+    """Counters for monitoring.
+    cancelled: OCR jobs killed because the client left or timed out, or (superseded) prefetch OCR jobs
+               killed because real requests arrived; those are also in prefetch.abandoned.
+    coalescing: computations run, and requests that shared another request's computation.
+    prefetch: requests answered from prefetched results, and prefetches done or abandoned.
+    scheduler: per priority class, queue depth, running jobs and wait times.
+    """
+    return {"cancelled": CANCELLED, "ocr_pool": ocr_pool.stats(), "coalescing": flights.stats(),
+            "workers": workers.stats(), "prefetch": prefetcher.stats(), "scheduler": scheduler.stats()}
+
+
+class WorkerRegistration(BaseModel):
+    url: str
+    capacity: int
+
+
+@app.post("/workers/register")
+def register_worker(registration: WorkerRegistration, request: Request, authorization: str | None = Header(None)):
+    """Called by worker nodes (worker_node.py) on start up, then every few seconds as a heartbeat.
+    Needs the OCR_WORKER_TOKEN bearer token, or without one, a request and URL from this machine.
+    """
+    if not authorized(authorization, request.client.host if request.client else None, workers.token):
+        raise HTTPException(status_code=401 if workers.token else 403, detail="Not allowed to register workers")
     try:
-        coding_video = _open_vid_or_404(vid)
-        return Response(content=coding_video.get_image_as_bytes(timestamp), media_type="image/png")
-    finally:
-        coding_video.capture.release()
+        workers.register(registration.url, registration.capacity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"registered": registration.url}
+
+
+@app.get("/workers")
+def list_workers():
+    """Known OCR worker nodes, their capacity and load"""
+    return {"workers": workers.stats()}
 
 
 @app.get("/video/{vid}/frame/{t}/ocr")
-def video_frame_ocr(vid: str, t: float):
+async def video_frame_ocr(vid: str, t: float, request: Request, response: Response, boxes: bool = False,
+                    tier: OcrTier = "balanced", deadline: float | None = None):
     """
     returns a string (as application/json) with the OCR text from the frame at specified time
+    boxes: instead return {"text", "words", "lines"} with word/line boxes and confidences,
+           from the same OCR pass (see library_basics.ocr_data)
+    tier: fast / balanced / accurate, see library_basics.OCR_TIERS
+    deadline: seconds. Past it the server falls back to the fast tier, or returns an empty result.
+    The X-OCR-Tier and X-OCR-Degraded response headers say what was actually done.
     """
-    try:
-        coding_video = _open_vid_or_404(vid)
-        return coding_video.get_text_from_time(t)
-    finally:
-        coding_video.capture.release()
+    started = time.monotonic()
+    path = _video_path_or_404(vid)
+    frame_number = await _frame_number(path, t)
+    key = ("ocr", vid, frame_number, tier, deadline, boxes, "interactive")
+    compute = _scheduled(_video_ocr_compute(vid, path, t, frame_number, tier, _deadline(started, deadline), boxes),
+                         "interactive", _client_id(request))
+    result = await _run_ocr_job(request, response, key, compute, ("ocr", vid, frame_number, tier, boxes))
+    await _prefetch_around(vid, path, t, (tier, boxes))
+    return result
+
+@app.get("/video/{vid}/ocr")
+async def video_ocr(vid: str, request: Request, interval: float = 5.0, tier: OcrTier = "accurate",
+                    start: float = 0.0, end: float | None = None):
+    """
+    Whole-video OCR: text of one frame every `interval` seconds (at least VIDEO_OCR_MIN_INTERVAL)
+    from start to end, as a batch job. start is clamped to the start of the video, end to its end.
+    Each frame takes its own batch slot, so interactive requests get in between frames.
+    Stops early if the client disconnects.
+    returns {"frames": [{"t": seconds, "text": ...}, ...]}
+    """
+    if not math.isfinite(interval) or interval < VIDEO_OCR_MIN_INTERVAL:
+        raise HTTPException(status_code=400, detail=f"interval must be at least {VIDEO_OCR_MIN_INTERVAL:g} seconds")
+    if not math.isfinite(start) or (end is not None and math.isnan(end)):
+        raise HTTPException(status_code=400, detail="start and end must be numbers of seconds")
+    path = _video_path_or_404(vid)
+    fps, duration = await _timing(path)
+    client = _client_id(request)
+    start = max(0.0, start)
+    stop = duration if end is None else min(end, duration)
+    count = int((stop - start) // interval) + 1 if stop >= start else 0
+    frames = []
+    for i in range(count):
+        t = round(start + i * interval, 3)      # from start each time, so float error doesn't add up
+        if await request.is_disconnected():
+            return Response(status_code=499)
+        frame_number = round(fps * t)
+        compute = _scheduled(_video_ocr_compute(vid, path, t, frame_number, tier, None, False), "batch", client)
+        try:
+            # keyed apart from interactive requests, so they never wait on a batch priority job
+            text, _, _ = await flights.do(("ocr", vid, frame_number, tier, None, False, "batch"), compute,
+                                          request.is_disconnected)
+        except JobCancelled as e:
+            if e.reason == "timeout":
+                raise HTTPException(status_code=504, detail=f"OCR timed out at {t}s")
+            return Response(status_code=499)
+        frames.append({"t": t, "text": text})
+    return {"frames": frames}
 
 @app.post("/frame/ocr")
-async def upload_frame_ocr(file:UploadFile = File(...)):
+async def upload_frame_ocr(request: Request, response: Response, file:UploadFile = File(...), boxes: bool = False,
+                           tier: OcrTier = "balanced", deadline: float | None = None):
+    # tier, deadline, boxes: as for /video/{vid}/frame/{t}/ocr
+    started = time.monotonic()
     # Check filename/type
     if file.content_type != "image/png":
         return {"error": "Only PNG images are allowed."}
 
     # Read the bytes from the uploaded file
     image_bytes = await file.read()
-    return CodingFrame(image_bytes).ocr()
+    key = ("upload", hashlib.sha256(image_bytes).hexdigest(), tier, deadline, boxes)
+
+    async def remote(is_disconnected):
+        return await workers.dispatch(image_bytes, tier, _deadline(started, deadline), boxes, is_disconnected)
+
+    compute = _scheduled(_ocr_compute(remote, ocr_image_job, image_bytes, tier, _deadline(started, deadline), boxes),
+                         "interactive", _client_id(request))
+    return await _run_ocr_job(request, response, key, compute)
 
 
@@ -0,0 +1,102 @@
+"""OCR worker node, for spreading OCR over more machines
+
+Runs OCR jobs for an API node (simple_api.py). On start up it registers with the API, and keeps
+re-registering as a heartbeat; the API then sends it PNG frames on POST /ocr.
+Jobs run in a local ocr_jobs.WorkerPool, so if the API drops a request, the job is killed here too.
+Across machines, give the API and every node the same OCR_WORKER_TOKEN (or --token); without one, the
+API only accepts nodes on its own machine (see worker_registry.py).
+
+usage:
+    python -m preliminary.worker_node --api http://localhost:8000 --port 9001 [--capacity 8] [--host 0.0.0.0]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Literal
+
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+
+from preliminary.ocr_jobs import WorkerPool, JobCancelled, ocr_image_job
+from preliminary.worker_registry import WORKER_TOKEN, auth_headers, authorized
+
+HEARTBEAT_INTERVAL = 10     # seconds; must be well under worker_registry.HEARTBEAT_TIMEOUT
+
+
+def create_app(api_url: str, own_url: str, capacity: int, token: str | None = WORKER_TOKEN) -> FastAPI:
+    """A worker node app, registering itself with api_url as own_url.
+    token: shared with the API; sent when registering, and required on jobs. None: loopback only.
+    """
+    pool = WorkerPool(capacity)
+
+    async def heartbeat():
+        import httpx    # not at module level, so the import doesn't hold up the server starting
+        async with httpx.AsyncClient(timeout=5, headers=auth_headers(token)) as client:
+            while True:
+                try:
+                    response = await client.post(f"{api_url}/workers/register",
+                                                 json={"url": own_url, "capacity": capacity})
+                    response.raise_for_status()
+                except httpx.HTTPError as e:
+                    print(f"Could not register with {api_url}: {e}", file=sys.stderr)
+                await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        task = asyncio.create_task(heartbeat())
+        yield
+        task.cancel()
+        pool.close()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "capacity": capacity, "pool": pool.stats()}
+
+    @app.post("/ocr")
+    async def ocr(request: Request, tier: Literal["fast", "balanced", "accurate"] = "balanced",
+                  deadline: float | None = None, boxes: bool = False, authorization: str | None = Header(None)):
+        """OCR a PNG sent as the request body. deadline: seconds remaining, as given by the API node."""
+        started = time.monotonic()
+        if not authorized(authorization, request.client.host if request.client else None, token):
+            raise HTTPException(status_code=401 if token else 403, detail="Not allowed to send jobs")
+        image_bytes = await request.body()
+        try:
+            result, used_tier, degraded = await pool.run(
+                ocr_image_job, image_bytes, tier, None if deadline is None else started + deadline, boxes,
+                is_disconnected=request.is_disconnected)
+        except JobCancelled as e:
+            if e.reason == "timeout":
+                raise HTTPException(status_code=504, detail="OCR timed out")
+            return Response(status_code=499)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"result": result, "tier": used_tier, "degraded": degraded}
+
+    return app
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description="OCR worker node")
+    parser.add_argument("--api", default="http://localhost:8000", help="URL of the API node to register with")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--capacity", type=int, default=os.cpu_count() or 1, help="concurrent OCR jobs")
+    parser.add_argument("--advertise", help="URL the API should use to reach this node (default: from host/port)")
+    parser.add_argument("--token", default=WORKER_TOKEN,
+                        help="shared secret, as set on the API (default: $OCR_WORKER_TOKEN; none: same machine only)")
+    args = parser.parse_args()
+
+    host = socket.gethostname() if args.host == "0.0.0.0" else args.host
+    own_url = args.advertise or f"http://{host}:{args.port}"
+    uvicorn.run(create_app(args.api.rstrip("/"), own_url, args.capacity, args.token or None),
+                host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Registry of remote OCR worker nodes, and dispatching OCR to them
+
+Worker nodes (see worker_node.py) register themselves with the API over HTTP, and re-register every
+few seconds as a heartbeat. The API sends each OCR job, as PNG bytes, to the live worker with the lowest
+queue depth relative to its capacity. If a worker fails, it is benched for a while and the job is retried
+on the next one. With no live workers, dispatch returns None and the API uses its local pool.
+
+A worker on localhost is a perfectly good worker, so all of this can be tried out on one machine:
+    fastapi run preliminary/simple_api.py --port 8000
+    python -m preliminary.worker_node --api http://localhost:8000 --port 9001
+    python -m preliminary.worker_node --api http://localhost:8000 --port 9002
+
+Registering makes the API send requests to the given URL, so it is not open to anyone. With
+OCR_WORKER_TOKEN set (the same value on the API and every node), registrations must carry it as a
+bearer token, and the API sends it with each job. Without a token, only a worker on the same machine
+(loopback client, loopback URL) may register, and nodes only take jobs from loopback clients.
+
+Reference: https://www.python-httpx.org/async/
+"""
+import asyncio
+import ipaddress
+import os
+import secrets
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    import httpx    # imported on first dispatch, so the API doesn't pay for it until a worker registers
+
+from preliminary.ocr_jobs import CANCELLED, JobCancelled, POLL_INTERVAL, REQUEST_TIMEOUT, cancel_reason
+
+HEARTBEAT_TIMEOUT = 30      # seconds without a heartbeat before a worker is considered gone
+FAILURE_BACKOFF = 10        # seconds a failed worker is skipped for
+WORKER_TOKEN = os.environ.get("OCR_WORKER_TOKEN") or None
+
+
+def is_loopback(host: str | None) -> bool:
+    """Is host (a name or IP address) this machine"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address((host or "").strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+
+def authorized(authorization: str | None, client_host: str | None, token: str | None) -> bool:
+    """Checks a request between the API and worker nodes: the bearer token if there is one, otherwise
+    that the request comes from this machine"""
+    if token is None:
+        return is_loopback(client_host)
+    return secrets.compare_digest((authorization or "").encode(), f"Bearer {token}".encode())
+
+
+def auth_headers(token: str | None) -> dict[str, str]:
+    return {} if token is None else {"authorization": f"Bearer {token}"}
+
+
+class RemoteWorker:
+    def __init__(self, url: str, capacity: int):
+        self.url = url.rstrip("/")
+        self.capacity = max(1, capacity)
+        self.last_seen = time.monotonic()
+        self.failed_until = 0.0
+        self.in_flight = 0
+        self.completed = 0
+        self.failures = 0
+
+    def is_live(self, now: float) -> bool:
+        return now - self.last_seen < HEARTBEAT_TIMEOUT and now >= self.failed_until
+
+    def load(self) -> float:
+        return self.in_flight / self.capacity
+
+
+class WorkerRegistry:
+    """Remote OCR workers known to this API node
+    token: shared secret required to register, and sent with each job; None allows loopback workers only
+    """
+    def __init__(self, token: str | None = WORKER_TOKEN):
+        self.token = token
+        self._workers: dict[str, RemoteWorker] = {}
+        self._client: "httpx.AsyncClient | None" = None
+
+    def register(self, url: str, capacity: int) -> RemoteWorker:
+        """Adds a worker, or refreshes its heartbeat (and clears any failure) if already known.
+        Raises ValueError for a URL that isn't http(s), or isn't loopback when there is no token.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Worker URL must be http(s)://host[:port], not {url!r}")
+        if self.token is None and not is_loopback(parts.hostname):
+            raise ValueError("Without OCR_WORKER_TOKEN set, only workers on this machine can register")
+        worker = self._workers.get(url.rstrip("/"))
+        if worker is None:
+            worker = self._workers[url.rstrip("/")] = RemoteWorker(url, capacity)
+        worker.capacity = max(1, capacity)
+        worker.last_seen = time.monotonic()
+        worker.failed_until = 0.0
+        return worker
+
+    def live(self) -> list[RemoteWorker]:
+        now = time.monotonic()
+        return [worker for worker in self._workers.values() if worker.is_live(now)]
+
+    async def dispatch(self, image_bytes: bytes, tier: str, deadline: float | None, boxes: bool,
+                       is_disconnected: Callable[[], Awaitable[bool]]) -> tuple[str | dict, str, bool] | None:
+        """OCR on the least loaded live worker, retrying on others if it fails.
+        deadline: time.monotonic() value, sent to the worker as seconds remaining.
+        returns run_ocr's (result, tier, degraded), or None if no worker could do it.
+        """
+        import httpx
+        tried: set[str] = set()
+        while True:
+            candidates = [worker for worker in self.live() if worker.url not in tried]
+            if not candidates:
+                return None
+            worker = min(candidates, key=RemoteWorker.load)
+            tried.add(worker.url)
+            worker.in_flight += 1
+            try:
+                result = await self._post(worker, image_bytes, tier, deadline, boxes, is_disconnected)
+            except (httpx.TransportError, httpx.HTTPStatusError):
+                worker.failures += 1
+                worker.failed_until = time.monotonic() + FAILURE_BACKOFF
+                continue
+            finally:
+                worker.in_flight -= 1
+            worker.completed += 1
+            return result
+
+    async def _post(self, worker: RemoteWorker, image_bytes: bytes, tier: str, deadline: float | None,
+                    boxes: bool, is_disconnected) -> tuple[str | dict, str, bool]:
+        """Sends one job. If our client disconnects, the HTTP request is dropped, which makes
+        the worker node kill its job in turn."""
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(timeout=REQUEST_TIMEOUT)
+        params = {"tier": tier, "boxes": boxes}
+        if deadline is not None:
+            params["deadline"] = max(0.0, deadline - time.monotonic())
+        request = asyncio.ensure_future(self._client.post(f"{worker.url}/ocr", params=params, content=image_bytes,
+                                                          headers={"content-type": "image/png",
+                                                                   **auth_headers(self.token)}))
+        try:
+            while not request.done():
+                await asyncio.wait([request], timeout=POLL_INTERVAL)
+                if not request.done() and (reason := await cancel_reason(is_disconnected)):
+                    CANCELLED[reason] += 1
+                    raise JobCancelled(reason)
+        finally:
+            request.cancel()
+        response = request.result()
+        if response.status_code == 504:
+            raise JobCancelled("timeout")
+        if response.status_code == 400:
+            raise ValueError(response.json().get("detail", "Bad request"))
+        response.raise_for_status()
+        body = response.json()
+        return body["result"], body["tier"], body["degraded"]
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        return [{"url": worker.url, "capacity": worker.capacity, "in_flight": worker.in_flight,
+                 "completed": worker.completed, "failures": worker.failures, "live": worker.is_live(now)}
+                for worker in self._workers.values()]
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
@@ -0,0 +1,110 @@
+"""Tests for SingleFlight request coalescing"""
+import asyncio
+
+import pytest
+
+from preliminary.coalesce import SingleFlight, _Flight
+
+
+async def connected() -> bool:
+    return False
+
+
+async def gone() -> bool:
+    return True
+
+
+def test_concurrent_calls_share_one_computation():
+    calls = 0
+
+    async def compute(is_disconnected):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        flights = SingleFlight()
+        results = await asyncio.gather(*[flights.do("key", compute, connected) for _ in range(10)])
+        return flights, results
+
+    flights, results = asyncio.run(main())
+    assert results == ["result"] * 10
+    assert calls == 1
+    assert flights.stats() == {"computed": 1, "coalesced": 9, "in_flight": 0}
+
+
+def test_later_calls_compute_again():
+    async def main():
+        flights = SingleFlight()
+        first = await flights.do("key", lambda _: asyncio.sleep(0, "first"), connected)
+        second = await flights.do("key", lambda _: asyncio.sleep(0, "second"), connected)
+        return first, second
+
+    assert asyncio.run(main()) == ("first", "second")
+
+
+def test_disconnected_only_once_every_waiter_has_gone():
+    checks = []
+    flag = {"second": False}
+
+    async def compute(all_disconnected):
+        await asyncio.sleep(0.01)       # let the second waiter join
+        checks.append(await all_disconnected())
+        flag["second"] = True
+        checks.append(await all_disconnected())
+        return "result"
+
+    async def second_gone() -> bool:
+        return flag["second"]
+
+    async def main():
+        flights = SingleFlight()
+        return await asyncio.gather(flights.do("key", compute, gone), flights.do("key", compute, second_gone))
+
+    assert asyncio.run(main()) == ["result", "result"]
+    assert checks == [False, True]
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_computation():
+    async def compute(is_disconnected):
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        flights = SingleFlight()
+        impatient = asyncio.ensure_future(flights.do("key", compute, connected))
+        patient = asyncio.ensure_future(flights.do("key", compute, connected))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(main()) == "result"
+
+
+def test_errors_reach_every_waiter():
+    async def compute(is_disconnected):
+        await asyncio.sleep(0.01)
+        raise ValueError("bad frame")
+
+    async def main():
+        flights = SingleFlight()
+        return await asyncio.gather(*[flights.do("key", compute, connected) for _ in range(3)],
+                                    return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
+
+
+def test_shared_reason_is_passed_on_once_all_have_gone():
+    async def superseded() -> str:
+        return "superseded"
+
+    async def main():
+        flight = _Flight(superseded)
+        alone = await flight.all_disconnected()
+        flight.waiters.append(gone)
+        return alone, await flight.all_disconnected()
+
+    assert asyncio.run(main()) == ("superseded", True)
@@ -0,0 +1,88 @@
+"""Tests for the memmapped frame cache shared between processes"""
+import multiprocessing
+import threading
+
+import numpy as np
+
+from preliminary.frame_cache import FrameCache
+
+SHAPE = (120, 160, 3)
+SLOTS = 16
+
+
+def frame(frame_number: int) -> np.ndarray:
+    return np.full(SHAPE, frame_number % 256, dtype=np.uint8)
+
+
+def put_frames(data_path, frame_numbers, start) -> None:
+    cache = FrameCache(data_path, SHAPE, SLOTS)
+    start.wait()
+    for frame_number in frame_numbers:
+        cache.put(frame_number, frame(frame_number))
+        cached = cache.get(frame_number)
+        assert cached is None or (cached == frame_number % 256).all(), "read a frame another process was writing"
+
+
+def assert_consistent(data_path) -> None:
+    """Every filled slot holds the frame its index entry says, and no frame is in two slots"""
+    cache = FrameCache(data_path, SHAPE, SLOTS, readonly=True)
+    filled = [int(n) for n in cache._index if n != -1]
+    assert len(filled) == len(set(filled))
+    for slot, frame_number in enumerate(cache._index):
+        if frame_number != -1:
+            assert (cache._data[slot] == frame_number % 256).all()
+
+
+def test_get_returns_what_was_put(tmp_path):
+    cache = FrameCache(tmp_path / "video.frames", SHAPE, SLOTS)
+    assert cache.get(3) is None
+    cache.put(3, frame(3))
+    assert (cache.get(3) == frame(3)).all()
+
+
+def test_frames_put_by_another_process_object_are_found(tmp_path):
+    FrameCache(tmp_path / "video.frames", SHAPE, SLOTS).put(7, frame(7))
+    assert (FrameCache(tmp_path / "video.frames", SHAPE, SLOTS).get(7) == frame(7)).all()
+
+
+def test_least_recently_used_frame_is_evicted(tmp_path):
+    cache = FrameCache(tmp_path / "video.frames", SHAPE, SLOTS)
+    for frame_number in range(SLOTS):
+        cache.put(frame_number, frame(frame_number))
+    cache.get(0)
+    cache.put(SLOTS, frame(SLOTS))
+    assert cache.get(1) is None
+    assert cache.get(0) is not None and cache.get(SLOTS) is not None
+
+
+def test_concurrent_puts_from_threads(tmp_path):
+    data_path = tmp_path / "video.frames"
+    cache = FrameCache(data_path, SHAPE, SLOTS)
+
+    def put_range(start):
+        for frame_number in range(start, start + 200):
+            cache.put(frame_number, frame(frame_number))
+            cache.get(frame_number - 1)
+
+    threads = [threading.Thread(target=put_range, args=(start,)) for start in range(0, 800, 100)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert_consistent(data_path)
+
+
+def test_concurrent_puts_from_processes(tmp_path):
+    data_path = tmp_path / "video.frames"
+    FrameCache(data_path, SHAPE, SLOTS)
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    processes = [ctx.Process(target=put_frames, args=(data_path, range(first, first + 1000), start))
+                 for first in range(0, 4000, 500)]
+    for process in processes:
+        process.start()
+    start.set()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    assert_consistent(data_path)
@@ -0,0 +1,67 @@
+"""Tests for OCR worker processes and the pool that kills them"""
+import asyncio
+import multiprocessing
+import time
+
+import pytest
+
+from preliminary.ocr_jobs import CANCELLED, _Worker, JobCancelled, KILL_TIMEOUT, WorkerPool, cancel_reason
+
+
+def test_worker_killed_straight_after_start_exits():
+    # the worker hasn't reached setpgrp yet, so killpg finds no group; kill must still work, and not hang
+    worker = _Worker(multiprocessing.get_context("spawn"))
+    started = time.monotonic()
+    worker.kill()
+    assert time.monotonic() - started < KILL_TIMEOUT
+    assert not worker.process.is_alive()
+
+
+def test_running_worker_is_killed():
+    worker = _Worker(multiprocessing.get_context("spawn"))
+    worker.conn.send((time.sleep, (60,)))
+    time.sleep(1)
+    worker.kill()
+    assert not worker.process.is_alive()
+
+
+def test_job_whose_client_left_while_queued_keeps_the_warm_worker():
+    async def gone() -> bool:
+        return True
+
+    async def main():
+        pool = WorkerPool(1)
+        running = asyncio.ensure_future(pool.run(time.sleep, 0.5))
+        await asyncio.sleep(0.1)
+        with pytest.raises(JobCancelled):
+            await pool.run(time.sleep, 0, is_disconnected=gone)
+        await running
+        stats = pool.stats()
+        pool.close()
+        return stats
+
+    assert asyncio.run(main()) == {"size": 1, "started": 1, "idle": 1}
+
+
+@pytest.mark.parametrize("gone, reason", [(False, None), (True, "disconnected"), ("superseded", "superseded")])
+def test_cancel_reason(gone, reason):
+    async def is_disconnected():
+        return gone
+
+    assert asyncio.run(cancel_reason(is_disconnected)) == reason
+
+
+def test_superseded_job_is_not_counted_as_a_disconnect():
+    async def superseded():
+        return "superseded"
+
+    async def main():
+        pool = WorkerPool(1)
+        with pytest.raises(JobCancelled) as cancelled:
+            await pool.run(time.sleep, 0, is_disconnected=superseded)
+        return cancelled.value.reason
+
+    before = dict(CANCELLED)
+    assert asyncio.run(main()) == "superseded"
+    assert CANCELLED["superseded"] == before["superseded"] + 1
+    assert CANCELLED["disconnected"] == before["disconnected"]
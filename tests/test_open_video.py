@@ -0,0 +1,43 @@
+"""Tests for reusing open videos between requests"""
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+from preliminary import library_basics
+from preliminary.library_basics import close_video, open_video
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    path = tmp_path / "video.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    for i in range(20):
+        writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_closed_video_and_its_buffers_are_reused(video_path):
+    video = open_video(video_path)
+    grey = video.get_frame_grey(5)
+    close_video(video)
+    again = open_video(video_path)
+    assert again is video
+    assert again.get_frame_grey(6) is grey      # same buffer, refilled
+    close_video(again)
+
+
+def test_videos_in_use_are_not_shared(video_path):
+    first, second = open_video(video_path), open_video(video_path)
+    assert first is not second
+    close_video(first)
+    close_video(second)
+
+
+def test_idle_videos_are_bounded(video_path, monkeypatch):
+    monkeypatch.setattr(library_basics, "IDLE_VIDEOS", 2)
+    videos = [open_video(video_path) for _ in range(4)]
+    for video in videos:
+        close_video(video)
+    assert sum(len(idle) for idle in library_basics._idle_videos.values()) == 2
+    assert not videos[0].capture.isOpened() and videos[-1].capture.isOpened()
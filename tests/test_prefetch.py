@@ -0,0 +1,92 @@
+"""Tests for speculative prefetch"""
+import asyncio
+
+from preliminary.coalesce import SingleFlight
+from preliminary.prefetch import Prefetcher, neighbour_times
+
+
+async def connected() -> bool:
+    return False
+
+
+def value(result):
+    async def compute(is_disconnected):
+        await asyncio.sleep(0.01)
+        return result
+    return compute
+
+
+def test_neighbours_are_nearest_first_and_inside_the_video():
+    assert neighbour_times(10, [30, 5], 100) == [15, 5, 40]
+
+
+def test_prefetched_results_are_served_from_the_cache():
+    async def main():
+        prefetcher = Prefetcher(SingleFlight())
+        prefetcher.schedule([("a", value("A")), ("b", value("B"))])
+        await prefetcher._task
+        return prefetcher
+
+    prefetcher = asyncio.run(main())
+    assert prefetcher.get("a") == "A" and prefetcher.get("b") == "B" and prefetcher.get("c") is None
+    assert prefetcher.stats()["hits"] == 2 and prefetcher.stats()["prefetched"] == 2
+
+
+def test_real_requests_do_not_join_a_running_prefetch():
+    calls = []
+
+    def compute(name):
+        async def run(is_disconnected):
+            calls.append(name)
+            await asyncio.sleep(0.05)
+            return name
+        return run
+
+    async def main():
+        flights = SingleFlight()
+        prefetcher = Prefetcher(flights)
+        prefetcher.schedule([("key", compute("prefetch"))])
+        await asyncio.sleep(0.01)       # prefetch is now running
+        with prefetcher.demand():
+            result = await flights.do("key", compute("real"), connected)
+        await prefetcher._task
+        return result
+
+    assert asyncio.run(main()) == "real"
+    assert calls == ["prefetch", "real"]
+
+
+def test_running_prefetch_sees_demand_as_a_disconnect():
+    reasons = []
+
+    async def compute(is_disconnected):
+        while not (reason := await is_disconnected()):
+            await asyncio.sleep(0.01)
+        reasons.append(reason)
+        raise RuntimeError("killed")
+
+    async def main():
+        prefetcher = Prefetcher(SingleFlight())
+        prefetcher.schedule([("key", compute)])
+        await asyncio.sleep(0.02)
+        with prefetcher.demand():
+            await asyncio.sleep(0.05)
+        await prefetcher._task
+        return prefetcher
+
+    prefetcher = asyncio.run(main())
+    assert prefetcher.stats()["abandoned"] == 1 and prefetcher.get("key") is None
+    assert reasons == ["superseded"]       # so the OCR pool doesn't count it as a client disconnecting
+
+
+def test_nothing_starts_while_a_real_request_is_running():
+    async def main():
+        prefetcher = Prefetcher(SingleFlight())
+        with prefetcher.demand():
+            prefetcher.schedule([("key", value("V"))])
+            await asyncio.sleep(0.05)
+            assert prefetcher.get("key") is None
+        await prefetcher._task
+        return prefetcher.get("key")
+
+    assert asyncio.run(main()) == "V"
@@ -0,0 +1,94 @@
+"""Tests for ocr_data's columnar output, and run_ocr's tiers and deadlines"""
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+from preliminary import library_basics
+from preliminary.library_basics import ocr_data, run_ocr
+
+NO_WORDS = {"level": [], "text": [], "conf": [], "left": [], "top": [], "width": [], "height": [],
+            "block_num": [], "par_num": [], "line_num": []}
+
+
+def test_expired_deadline_with_boxes_keeps_the_columnar_shape(monkeypatch):
+    monkeypatch.setattr(library_basics.pytesseract, "image_to_data", lambda *args, **kwargs: NO_WORDS)
+    image = np.zeros((10, 10), dtype=np.uint8)
+    result, tier, degraded = run_ocr(image, "accurate", deadline=time.monotonic() - 1, boxes=True)
+    assert degraded and tier == "accurate"
+    assert result == ocr_data(image)
+
+
+def test_expired_deadline_without_boxes_is_empty_text():
+    assert run_ocr(np.zeros((10, 10), dtype=np.uint8), "fast", deadline=time.monotonic() - 1) == ("", "fast", True)
+
+
+def test_ocr_data_groups_words_into_lines_and_paragraphs(monkeypatch):
+    # paragraph 1: "def f():" / "return 1" (two lines); paragraph 2: "x" (one line).
+    # level 5 rows are words; the level 4 row is a line, and empty words are skipped
+    rows = [
+        # level, text, block, par, line, left, top, width, height, conf
+        (4, "", 1, 1, 1, 10, 10, 100, 12, -1),
+        (5, "def", 1, 1, 1, 10, 10, 30, 12, 95),
+        (5, "f():", 1, 1, 1, 50, 8, 40, 16, 90),
+        (5, " ", 1, 1, 1, 95, 10, 5, 12, 0),
+        (5, "return", 1, 1, 2, 30, 30, 60, 12, 88.6),
+        (5, "1", 1, 1, 2, 100, 30, 10, 12, 70),
+        (5, "x", 2, 1, 1, 10, 60, 10, 12, 99),
+    ]
+    keys = ("level", "text", "block_num", "par_num", "line_num", "left", "top", "width", "height", "conf")
+    data = {key: [row[i] for row in rows] for i, key in enumerate(keys)}
+    monkeypatch.setattr(library_basics.pytesseract, "image_to_data", lambda *args, **kwargs: data)
+
+    result = ocr_data(np.zeros((100, 200), dtype=np.uint8))
+
+    assert result["text"] == "def f():\nreturn 1\n\nx"
+    assert result["words"] == {"text": ["def", "f():", "return", "1", "x"],
+                               "left": [10, 50, 30, 100, 10], "top": [10, 8, 30, 30, 60],
+                               "width": [30, 40, 60, 10, 10], "height": [12, 16, 12, 12, 12],
+                               "conf": [95, 90, 89, 70, 99], "line": [0, 0, 1, 1, 2]}
+    # each line's box grows to cover all its words
+    assert result["lines"] == {"left": [10, 30, 10], "top": [8, 30, 60],
+                               "width": [80, 80, 10], "height": [16, 12, 12]}
+
+
+def test_slow_tier_timing_out_falls_back_to_fast(monkeypatch):
+    calls = []
+
+    def run_tier(image, tier, timeout, boxes):
+        calls.append((tier, timeout))
+        if tier == "accurate":
+            raise RuntimeError("Tesseract process timeout")
+        return "fast text"
+
+    monkeypatch.setattr(library_basics, "_run_tier", run_tier)
+    result = run_ocr(np.zeros((10, 10), dtype=np.uint8), "accurate", deadline=time.monotonic() + 3)
+
+    assert result == ("fast text", "fast", True)
+    (slow_tier, slow_timeout), (fast_tier, fast_timeout) = calls
+    assert (slow_tier, fast_tier) == ("accurate", "fast")
+    # the slow tier gets DEADLINE_SHARE of the time left, the fast tier all that's left when it starts
+    # (here nearly all of it, as the mocked slow tier gave up at once)
+    assert slow_timeout == pytest.approx(3 * library_basics.DEADLINE_SHARE, abs=0.1)
+    assert fast_timeout == pytest.approx(3, abs=0.1)
+
+
+def test_slow_tier_in_time_is_not_degraded(monkeypatch):
+    monkeypatch.setattr(library_basics, "_run_tier", lambda image, tier, timeout, boxes: f"{tier} text")
+    assert run_ocr(np.zeros((10, 10), dtype=np.uint8), "accurate", deadline=time.monotonic() + 3) == \
+        ("accurate text", "accurate", False)
+
+
+def test_other_tesseract_errors_are_raised(monkeypatch):
+    def run_tier(image, tier, timeout, boxes):
+        raise RuntimeError("Failed loading language 'eng'")
+
+    monkeypatch.setattr(library_basics, "_run_tier", run_tier)
+    with pytest.raises(RuntimeError, match="language"):
+        run_ocr(np.zeros((10, 10), dtype=np.uint8), "accurate", deadline=time.monotonic() + 3)
+
+
+def test_unknown_tier_is_rejected():
+    with pytest.raises(ValueError):
+        run_ocr(np.zeros((10, 10), dtype=np.uint8), "instant")
@@ -0,0 +1,86 @@
+"""Tests for the priority scheduler"""
+import asyncio
+
+import pytest
+
+from preliminary.scheduler import Scheduler
+
+
+async def hold(scheduler, priority, client, order, release):
+    async with scheduler.slot(priority, client):
+        order.append((priority, client))
+        await release.wait()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_higher_class_goes_first():
+    async def main():
+        scheduler, order, release = Scheduler(lambda: 1), [], asyncio.Event()
+        blocker = asyncio.ensure_future(hold(scheduler, "interactive", "a", [], release))
+        await settle()
+        tasks = [asyncio.ensure_future(hold(scheduler, priority, "b", order, release))
+                 for priority in ("background", "batch", "interactive")]
+        await settle()
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    assert [priority for priority, _ in asyncio.run(main())] == ["interactive", "batch", "background"]
+
+
+def test_clients_take_turns_within_a_class():
+    async def main():
+        scheduler, order, release = Scheduler(lambda: 2), [], asyncio.Event()
+        # batch gets capacity - 1 slots, ie. one at a time
+        blocker = asyncio.ensure_future(hold(scheduler, "batch", "first", [], release))
+        await settle()
+        tasks = [asyncio.ensure_future(hold(scheduler, "batch", client, order, release))
+                 for client in ["greedy"] * 3 + ["other"] * 2]
+        await settle()
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        return [client for _, client in order]
+
+    assert asyncio.run(main()) == ["greedy", "other", "greedy", "other", "greedy"]
+
+
+def test_lower_classes_leave_a_slot_for_interactive_work():
+    async def main():
+        scheduler, release = Scheduler(lambda: 4), asyncio.Event()
+        tasks = [asyncio.ensure_future(hold(scheduler, "batch", "a", [], release)) for _ in range(4)]
+        tasks += [asyncio.ensure_future(hold(scheduler, "background", "b", [], release)) for _ in range(2)]
+        await settle()
+        stats = scheduler.stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        return stats
+
+    stats = asyncio.run(main())
+    assert stats["batch"]["running"] == 3 and stats["batch"]["queued"] == 1
+    assert stats["background"]["running"] == 0
+
+
+def test_cancelled_while_queued_gives_up_its_place():
+    async def main():
+        scheduler, order, release = Scheduler(lambda: 1), [], asyncio.Event()
+        blocker = asyncio.ensure_future(hold(scheduler, "interactive", "a", [], release))
+        await settle()
+        cancelled = asyncio.ensure_future(hold(scheduler, "interactive", "b", order, release))
+        waiting = asyncio.ensure_future(hold(scheduler, "interactive", "c", order, release))
+        await settle()
+        cancelled.cancel()
+        await settle()
+        queued = scheduler.stats()["interactive"]["queued"]
+        release.set()
+        await asyncio.gather(blocker, waiting)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        return order, queued, scheduler.stats()["interactive"]["running"]
+
+    order, queued, running = asyncio.run(main())
+    assert order == [("interactive", "c")]
+    assert queued == 1 and running == 0
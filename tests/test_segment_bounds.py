@@ -0,0 +1,21 @@
+"""Tests for how CodingVideo.map_frames splits a video between worker processes"""
+import pytest
+
+pytest.importorskip("cv2")
+from preliminary.library_basics import _segment_bounds
+
+
+@pytest.mark.parametrize("frame_count, step, segments", [(100, 7, 4), (1000, 30, 32), (10, 1, 32), (31, 30, 2)])
+def test_segments_cover_the_video_with_the_same_samples(frame_count, step, segments):
+    bounds = _segment_bounds(frame_count, step, segments)
+    assert len(bounds) <= segments
+    assert bounds[0][0] == 0 and bounds[-1][1] == frame_count
+    assert all(end == next_start for (_, end), (next_start, _) in zip(bounds, bounds[1:]))
+    # every segment starts on the sampling grid, so sampling each segment from its start
+    # gives exactly the frames one sequential pass would
+    sampled = [n for start, end in bounds for n in range(start, end, step)]
+    assert sampled == list(range(0, frame_count, step))
+
+
+def test_empty_video_has_no_segments():
+    assert _segment_bounds(0, 5, 4) == []
@@ -0,0 +1,33 @@
+"""Tests for how incremental OCR splits a frame into tiles of text"""
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+from preliminary import library_basics
+from preliminary.library_basics import _ocr_tiles, _text_tiles
+
+
+def ide_frame() -> np.ndarray:
+    """A dark frame with a side bar on the left and two lines of 'text' in an editor on the right"""
+    frame = np.full((200, 400), 30, dtype=np.uint8)
+    # 'glyphs' are every other column, so each line has contrast along its rows
+    frame[10:20, 5:81:2] = 220          # side bar, one line
+    frame[10:20, 120:391:2] = 220       # editor, line 1 - on the same rows as the side bar line
+    frame[60:70, 120:301:2] = 220       # editor, line 2
+    return frame
+
+
+def test_side_by_side_regions_are_separate_tiles():
+    assert _text_tiles(ide_frame()) == [(10, 20, 5, 80), (10, 20, 120, 391), (60, 70, 120, 391)]
+
+
+def test_blank_frame_has_no_tiles():
+    assert _text_tiles(np.full((50, 50), 128, dtype=np.uint8)) == []
+
+
+def test_word_in_leading_spacer_goes_to_first_tile(monkeypatch):
+    data = {"text": ["hello"], "conf": ["90"], "top": [0], "height": [4],
+            "block_num": [1], "par_num": [1], "line_num": [1]}
+    monkeypatch.setattr(library_basics.pytesseract, "image_to_data", lambda *args, **kwargs: data)
+    tiles = _text_tiles(ide_frame())
+    assert _ocr_tiles(ide_frame(), tiles) == {tiles[0]: "hello", tiles[1]: "", tiles[2]: ""}
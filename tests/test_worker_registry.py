@@ -0,0 +1,39 @@
+"""Tests for who may register OCR worker nodes"""
+import pytest
+
+from preliminary.worker_registry import WorkerRegistry, authorized
+
+
+def test_without_a_token_only_loopback_clients_are_authorized():
+    assert authorized(None, "127.0.0.1", None)
+    assert authorized(None, "::1", None)
+    assert not authorized(None, "192.168.1.20", None)
+    assert not authorized("Bearer anything", None, None)
+
+
+def test_with_a_token_the_client_must_send_it():
+    assert authorized("Bearer s3cret", "192.168.1.20", "s3cret")
+    assert not authorized("Bearer wrong", "127.0.0.1", "s3cret")
+    assert not authorized(None, "127.0.0.1", "s3cret")
+
+
+@pytest.mark.parametrize("url", ["http://localhost:9001", "http://127.0.0.1:9001/", "https://[::1]:9001"])
+def test_loopback_workers_register_without_a_token(url):
+    registry = WorkerRegistry(token=None)
+    registry.register(url, 4)
+    assert len(registry.live()) == 1
+
+
+@pytest.mark.parametrize("url", ["http://169.254.169.254/latest", "http://10.0.0.5:9001", "file:///etc/passwd",
+                                 "localhost:9001"])
+def test_other_urls_are_refused_without_a_token(url):
+    with pytest.raises(ValueError):
+        WorkerRegistry(token=None).register(url, 4)
+
+
+def test_remote_workers_register_with_a_token():
+    registry = WorkerRegistry(token="s3cret")
+    registry.register("http://10.0.0.5:9001", 4)
+    with pytest.raises(ValueError):
+        registry.register("gopher://10.0.0.5:70", 4)
+    assert [worker.url for worker in registry.live()] == ["http://10.0.0.5:9001"]